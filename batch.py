@@ -0,0 +1,86 @@
+"""
+Vectorized checks for many boards at once, using NumPy.
+
+Boards are passed as an (N, 81) array of uint8 values, where 0 is a blank.
+Every function works on the whole batch in a handful of array operations,
+so validating or analysing a bank of grids never loops over boards or cells
+in Python.
+"""
+from collections import namedtuple
+import numpy as np
+from engine import UNIT_CELLS, UNITS_OF
+
+# (27, 9) cell indices of every unit, and (81, 3) units of every cell.
+UNIT_INDEX = np.array(UNIT_CELLS, dtype=np.intp)
+UNITS_OF_CELL = np.array(UNITS_OF, dtype=np.intp)
+DIGITS = np.arange(1, 10, dtype=np.uint8)
+
+BatchReport = namedtuple("BatchReport", "valid conflicts candidates")
+BatchReport.__doc__ = """The result of analyse_boards.
+valid: (N,) bool, True if the board has no conflicting values.
+conflicts: (N, 81) bool, True for every cell whose value appears more than
+    once in its row, column, or house. np.nonzero(conflicts) gives the
+    (board, cell) indices of the conflicting cells.
+candidates: (N, 81, 9) bool, True if digit d + 1 could be placed in the
+    cell; filled cells have no candidates."""
+
+
+def as_boards(boards) -> np.ndarray:
+    """Convert boards to an (N, 81) uint8 array. boards may already be an
+    array, a list of 81-value sequences, or a list of SudokuBoards."""
+    if not isinstance(boards, np.ndarray):
+        boards = [
+            [int(v) for v in getattr(board, "array", board)] for board in boards
+        ]
+    boards = np.asarray(boards, dtype=np.uint8).reshape(-1, 81)
+    if (boards > 9).any():
+        raise ValueError("Values must be within [0, 9]")
+    return boards
+
+
+def unit_counts(boards) -> np.ndarray:
+    """Return an (N, 27, 9) array counting how often each digit appears in
+    each unit."""
+    onehot = boards[:, :, None] == DIGITS
+    return onehot[:, UNIT_INDEX, :].sum(axis=2, dtype=np.uint8)
+
+
+def _conflicts(boards, counts):
+    # a cell conflicts if its digit is counted twice in any of its units
+    duplicated = (counts > 1)[:, UNITS_OF_CELL, :].any(axis=2)
+    digit_index = np.maximum(boards.astype(np.intp) - 1, 0)[:, :, None]
+    conflicts = np.take_along_axis(duplicated, digit_index, axis=2)[:, :, 0]
+    conflicts &= boards != 0
+    return ~conflicts.any(axis=1), conflicts
+
+
+def _candidates(boards, counts):
+    seen = (counts > 0)[:, UNITS_OF_CELL, :].any(axis=2)
+    return ~seen & (boards == 0)[:, :, None]
+
+
+def analyse_boards(boards) -> BatchReport:
+    """Validate a batch of boards and compute their candidates, sharing
+    the unit counts between the two."""
+    boards = as_boards(boards)
+    counts = unit_counts(boards)
+    valid, conflicts = _conflicts(boards, counts)
+    return BatchReport(valid, conflicts, _candidates(boards, counts))
+
+
+def validate_boards(boards, require_complete: bool = False):
+    """Return (valid, conflicts) for a batch of boards, as described in
+    BatchReport. With require_complete, boards that still have blanks are
+    also invalid."""
+    boards = as_boards(boards)
+    valid, conflicts = _conflicts(boards, unit_counts(boards))
+    if require_complete:
+        valid &= (boards != 0).all(axis=1)
+    return valid, conflicts
+
+
+def candidate_masks(boards) -> np.ndarray:
+    """Return the (N, 81, 9) candidates of a batch of boards, as described
+    in BatchReport."""
+    boards = as_boards(boards)
+    return _candidates(boards, unit_counts(boards))
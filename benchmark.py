@@ -0,0 +1,365 @@
+"""
+Timing helpers for the puzzle engine.
+
+Run this file directly to time the engine's hot paths on both board
+classes. Every case runs from fixed seeds, so two runs do the same work,
+and reports the median and 95th percentile time per operation, operations
+per second, and the memory allocated, as measured by tracemalloc:
+
+    python benchmark.py
+    python benchmark.py --json baseline.json
+    python benchmark.py --compare baseline.json
+
+--compare exits with status 1 if any case's median got slower than the
+baseline by more than --threshold. --reports also prints the older
+reports: the time each board class takes to generate one puzzle, the
+per-call latency of the region lookups, the solver's throughput, and the
+time window.Game takes to draw a full board. --corpus times the solver and
+grader on a local puzzle collection, in any format puzzletext.py reads.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+import tracemalloc
+from engine import SudokuBoard, GENERATOR_VERSION
+from bitboard import BitBoard
+from solver import Solver, solve
+from grader import Grader
+from puzzletext import read_puzzles
+
+
+def time_per_board(board_class, boards: int = 200, clues: int = 30):
+    """Return the average number of seconds board_class takes to generate
+    one puzzle with the given number of clues."""
+    board = board_class()
+    start = time.perf_counter()
+    for _ in range(boards):
+        board.generate_puzzle(clues)
+    return (time.perf_counter() - start) / boards
+
+
+def time_per_call(func, *args, calls: int = 20000):
+    """Return the average number of seconds one call of func(*args)
+    takes."""
+    start = time.perf_counter()
+    for _ in range(calls):
+        func(*args)
+    return (time.perf_counter() - start) / calls
+
+
+def engine_calls(calls: int = 20000):
+    """Print the per-call latency of the engine's region lookups."""
+    board = SudokuBoard()
+    board.generate_puzzle(30)
+    board.generate_candidates()
+    pos = board.array.index(0) if 0 in board.array else 0
+    for name, func, args in (
+        ("find_negaters", board.find_negaters, (pos,)),
+        ("find_relevant_region", board.find_relevant_region, (pos,)),
+        ("update_candidates_removal", board.update_candidates_removal, (pos, 5)),
+    ):
+        per_call = time_per_call(func, *args, calls=calls)
+        print(f"{name:26} {per_call * 1e6:8.2f} us per call")
+
+
+def solver_throughput(puzzles: int = 200, clues: int = 30):
+    """Print how many generated puzzles per second the solver can check
+    for uniqueness."""
+    board = BitBoard()
+    grids = []
+    for _ in range(puzzles):
+        board.generate_puzzle(clues)
+        grids.append(bytes(board.array))
+    start = time.perf_counter()
+    for grid in grids:
+        Solver(grid).count_solutions(2)
+    elapsed = time.perf_counter() - start
+    print(f"Solver: {puzzles / elapsed:8.1f} uniqueness checks per second")
+
+
+def corpus_throughput(path, limit: int = 1000):
+    """Print how fast the puzzles in the text file at path are parsed, and
+    how many of the first limit of them per second the solver can check
+    for uniqueness and the grader can grade."""
+    start = time.perf_counter()
+    puzzles = 0
+    grids = []
+    for puzzle, _ in read_puzzles(path):
+        puzzles += 1
+        if len(grids) < limit:
+            grids.append(puzzle)
+    elapsed = time.perf_counter() - start
+    megabytes = os.path.getsize(path) / 1e6
+    print(f"Corpus: {puzzles} puzzles, {megabytes / elapsed:8.1f} MB/s parsed")
+    for name, work in (("solver", lambda g: Solver(g).count_solutions(2)),
+                       ("grader", lambda g: Grader(g).grade())):
+        start = time.perf_counter()
+        for grid in grids:
+            work(grid)
+        elapsed = time.perf_counter() - start
+        print(f"Corpus {name}: {len(grids) / elapsed:8.1f} puzzles per second")
+
+
+def frame_time(frames: int = 50):
+    """Print the time it takes window.Game to draw a full board, first
+    rendering every number with the font, as draw_number did before the
+    glyph atlas, and then blitting the numbers from the atlas. Runs without
+    a window through SDL's dummy video driver."""
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    import window
+
+    game = window.Game()
+    game.setup()
+    for i, val in enumerate(solve(game.engine)):
+        game.engine.set_value(i, val)
+    atlas_draw_number = game.window.draw_number
+
+    def font_draw_number(number, cell, style="entry"):
+        surface = game.window.font.render(str(number), True, game.window.dimensions.black)
+        game.window.display.display.blit(surface, game.window.dimensions.cell_coordinates_number(cell))
+
+    for name, draw_number in (("font.render", font_draw_number),
+                              ("glyph atlas", atlas_draw_number)):
+        game.window.draw_number = draw_number
+        start = time.perf_counter()
+        for _ in range(frames):
+            game.draw()
+        per_frame = (time.perf_counter() - start) / frames
+        print(f"Full board, {name:12} {per_frame * 1000:8.3f} ms per frame")
+
+
+def compare_boards(boards: int = 200, clues: int = 30):
+    square_time = time_per_board(SudokuBoard, boards, clues)
+    bit_time = time_per_board(BitBoard, boards, clues)
+    print(f"SudokuBoard: {square_time * 1000:8.3f} ms per board")
+    print(f"BitBoard:    {bit_time * 1000:8.3f} ms per board")
+    print(f"Speedup:     {square_time / bit_time:8.2f}x")
+
+
+# Each case sets up a board from a seed, untimed, and returns (run, ops):
+# a callable doing the timed work, and the number of operations it does.
+
+def _filled(board_class, seed, clues=30):
+    board = board_class(seed=seed)
+    board.generate_puzzle(clues)
+    return board
+
+
+def case_fill_puzzle(board_class, seed):
+    board = board_class(seed=seed)
+    return board.fill_puzzle, 1
+
+
+def case_generate_puzzle(clues):
+    def case(board_class, seed):
+        board = board_class(seed=seed)
+        return lambda: board.generate_puzzle(clues), 1
+    return case
+
+
+def case_generate_candidates(board_class, seed):
+    board = _filled(board_class, seed)
+    return board.generate_candidates, 1
+
+
+def case_find_candidates(board_class, seed):
+    board = _filled(board_class, seed)
+    def run():
+        for i in range(81):
+            board.find_candidates(i)
+    return run, 81
+
+
+def case_update_candidates_new(board_class, seed):
+    board = _filled(board_class, seed)
+    board.generate_candidates()
+    blanks = [i for i in range(81) if board.array[i] == 0]
+    def run():
+        for i in blanks:
+            board.update_candidates_new(i, 5)
+    return run, len(blanks)
+
+
+def case_update_candidates_removal(board_class, seed):
+    board = _filled(board_class, seed)
+    board.generate_candidates()
+    clues = [(i, int(board.array[i])) for i in board.clues]
+    # the values must be gone before their candidates can be given back;
+    # set_value does not touch the candidates unless they are tracked
+    for i, _ in clues:
+        board.set_value(i, 0)
+    def run():
+        for i, val in clues:
+            board.update_candidates_removal(i, val)
+    return run, len(clues)
+
+
+def case_region_is_valid(board_class, seed):
+    board = _filled(board_class, seed)
+    def run():
+        for i in range(81):
+            board.region_is_valid(i)
+    return run, 81
+
+
+def case_set_remove_value(board_class, seed):
+    """A value entered and erased again, as the window does; this is where
+    the conflict index is kept up to date."""
+    board = _filled(board_class, seed)
+    blanks = [i for i in range(81) if board.array[i] == 0]
+    def run():
+        for i in blanks:
+            board.set_value(i, 5)
+            board.remove_value(i)
+    return run, 2 * len(blanks)
+
+
+CASES = {
+    "fill_puzzle": case_fill_puzzle,
+    "generate_puzzle[24]": case_generate_puzzle(24),
+    "generate_puzzle[30]": case_generate_puzzle(30),
+    "generate_puzzle[40]": case_generate_puzzle(40),
+    "generate_candidates": case_generate_candidates,
+    "find_candidates": case_find_candidates,
+    "update_candidates_new": case_update_candidates_new,
+    "update_candidates_removal": case_update_candidates_removal,
+    "region_is_valid": case_region_is_valid,
+    "set_value+remove_value": case_set_remove_value,
+}
+BOARD_CLASSES = {"SudokuBoard": SudokuBoard, "BitBoard": BitBoard}
+
+
+def measure(case, board_class, samples: int = 30, seed: int = 0) -> dict:
+    """Time case on board_class once per seed, from seed to seed + samples,
+    and then once more under tracemalloc. Times are per operation."""
+    # one untimed run first, so the first sample does not pay for warm-up
+    case(board_class, seed)[0]()
+    times = []
+    for k in range(samples):
+        run, ops = case(board_class, seed + k)
+        start = time.perf_counter()
+        run()
+        times.append((time.perf_counter() - start) / ops)
+    # tracing slows everything down, so allocations get a run of their own
+    run, ops = case(board_class, seed)
+    tracemalloc.start()
+    try:
+        run()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    median = statistics.median(times)
+    return {
+        "samples": samples,
+        "median_us": median * 1e6,
+        "p95_us": statistics.quantiles(times, n=20)[18] * 1e6 if samples > 1
+            else median * 1e6,
+        "ops_per_sec": 1 / median if median else float("inf"),
+        "alloc_peak_bytes": peak,
+        "alloc_net_bytes": current,
+    }
+
+
+def run_suite(samples: int = 30, seed: int = 0, boards=None, only=None) -> dict:
+    """Run every case whose name contains only on each board class named
+    in boards, and return the results, keyed "BoardClass.case", along
+    with enough about the run to compare it against later."""
+    results = {}
+    for board_name in boards or BOARD_CLASSES:
+        for case_name, case in CASES.items():
+            if only and only not in case_name:
+                continue
+            results[f"{board_name}.{case_name}"] = measure(
+                case, BOARD_CLASSES[board_name], samples, seed
+            )
+    return {
+        "python": platform.python_version(),
+        "machine": platform.machine(),
+        "generator_version": GENERATOR_VERSION,
+        "samples": samples,
+        "seed": seed,
+        "results": results,
+    }
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.10) -> list:
+    """Return (name, baseline median, current median, ratio) for every
+    case whose median is more than threshold slower than in baseline.
+    Cases missing from either run are skipped."""
+    regressions = []
+    for name, result in current["results"].items():
+        base = baseline["results"].get(name)
+        if base is None or not base["median_us"]:
+            continue
+        ratio = result["median_us"] / base["median_us"]
+        if ratio > 1 + threshold:
+            regressions.append((name, base["median_us"], result["median_us"], ratio))
+    return regressions
+
+
+def print_results(run: dict, baseline: dict = None):
+    print(f"{'case':42} {'median us':>10} {'p95 us':>10} {'ops/s':>12} "
+          f"{'peak KiB':>9}" + (f" {'vs base':>8}" if baseline else ""))
+    for name, result in run["results"].items():
+        line = (f"{name:42} {result['median_us']:10.2f} {result['p95_us']:10.2f} "
+                f"{result['ops_per_sec']:12.0f} {result['alloc_peak_bytes'] / 1024:9.1f}")
+        base = baseline["results"].get(name) if baseline else None
+        if base and base["median_us"]:
+            line += f" {result['median_us'] / base['median_us']:7.2f}x"
+        print(line)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the puzzle engine.")
+    parser.add_argument("--samples", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--board", choices=sorted(BOARD_CLASSES), action="append",
+                        help="only run this board class (repeatable)")
+    parser.add_argument("--only", default=None,
+                        help="only run cases whose name contains this")
+    parser.add_argument("--json", default=None,
+                        help="write the results to this file")
+    parser.add_argument("--compare", default=None,
+                        help="baseline results to check for regressions")
+    parser.add_argument("--threshold", type=float, default=0.10,
+                        help="how much slower a median may get (default: 0.10)")
+    parser.add_argument("--reports", action="store_true",
+                        help="also print the older reports, including frame time")
+    parser.add_argument("--corpus", default=None,
+                        help="also time the solver and grader on this puzzle file")
+    parser.add_argument("--corpus-limit", type=int, default=1000,
+                        help="puzzles of the corpus to solve and grade")
+    args = parser.parse_args(argv)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    run = run_suite(args.samples, args.seed, args.board, args.only)
+    print_results(run, baseline)
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump(run, f, indent=2)
+    if args.reports:
+        compare_boards()
+        engine_calls()
+        solver_throughput()
+        frame_time()
+    if args.corpus:
+        corpus_throughput(args.corpus, args.corpus_limit)
+    if baseline is not None:
+        regressions = compare(baseline, run, args.threshold)
+        for name, before, after, ratio in regressions:
+            print(f"REGRESSION {name}: {before:.2f} us -> {after:.2f} us "
+                  f"({ratio:.2f}x)")
+        if regressions:
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
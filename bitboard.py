@@ -0,0 +1,155 @@
+"""
+A compact, bitmask-backed version of SudokuBoard.
+
+Instead of 81 Square objects, the values live in a flat bytearray of length
+81. Every unit (the 9 rows, 9 columns, and 9 houses) keeps a count of each
+digit it contains, along with a 9-bit occupancy mask derived from those
+counts. Bit v of a mask (1 <= v <= 9) is set when digit v is present in the
+unit, so the candidates of a cell are the bits missing from the union of its
+row, column, and house masks.
+
+Units are numbered 0 - 26: rows are 0 - 8, columns 9 - 17, and houses 18 - 26.
+"""
+from array import array
+import random
+from engine import (
+    SudokuBoard, ROW_OF, COL_OF, HOUSE_OF, UNITS_OF, REGION_OF,
+    ALL_DIGITS, MASK_DIGITS,
+)
+
+
+class BitBoard(SudokuBoard):
+    """A SudokuBoard whose cells are plain ints and whose candidates are
+    bitmasks. It keeps the same method names, so it can be used anywhere a
+    SudokuBoard is expected."""
+    def __init__(self, seed=None, rng: random.Random = None):
+        self.random = rng if rng is not None else random.Random(seed)
+        self._clear()
+
+    def _clear(self):
+        """resets the puzzle array to empty"""
+        self.array = bytearray(81)
+        # candidates[i] is the candidate mask of cell i
+        self.candidates = array('H', bytes(2 * 81))
+        self._reset_counts()
+        self._reset_clues()
+        self.solution = b''
+        if self.tracking:
+            self.generate_candidates()
+
+    def set_value(self, pos, val):
+        """Set the value at the given position."""
+        if not isinstance(val, int):
+            raise TypeError("Value must be an integer")
+        if val < 0 or val > 9:
+            raise ValueError("Value must be within [0, 9]")
+        old = self.array[pos]
+        self.array[pos] = val
+        if old:
+            self._unplace(pos, old)
+        if val:
+            self._place(pos, val)
+        solution = self.solution
+        if solution:
+            right = solution[pos]
+            self.error_count += (val and val != right) - (old and old != right)
+        if self.tracking:
+            self._update_candidates(pos, old, val)
+
+    def remove_value(self, pos):
+        """Remove the value from the array by setting it to zero."""
+        self.set_value(pos, 0)
+
+    def num_is_in_row(self, pos: int, num: int):
+        return bool(self.unit_masks[ROW_OF[pos]] >> num & 1)
+
+    def num_is_in_col(self, pos: int, num: int):
+        return bool(self.unit_masks[9 + COL_OF[pos]] >> num & 1)
+
+    def num_is_in_house(self, pos: int, num: int):
+        return bool(self.unit_masks[18 + HOUSE_OF[pos]] >> num & 1)
+
+    def num_is_in_col_row_or_house(self, pos: int, num: int):
+        return bool(self.occupied_mask(pos) >> num & 1)
+
+    def find_negaters(self, pos: int):
+        return set(MASK_DIGITS[self.occupied_mask(pos)])
+
+    def find_candidates(self, pos) -> set:
+        return set(MASK_DIGITS[self.candidate_mask(pos)])
+
+    def update_candidates_new(self, pos, val) -> None:
+        """Remove val from the candidate masks of pos and its peers."""
+        bit = 1 << val
+        candidates = self.candidates
+        touched = self.candidates_touched
+        for i in REGION_OF[pos]:
+            if candidates[i] & bit:
+                candidates[i] ^= bit
+                touched.add(i)
+
+    def update_candidates_removal(self, pos, val) -> None:
+        """Give val back to every empty square in the relevant region of
+        pos that no longer sees it, unless it was struck out by hand."""
+        bit = 1 << val
+        candidates = self.candidates
+        masks = self.unit_masks
+        struck = self.struck
+        values = self.array
+        touched = self.candidates_touched
+        for i in REGION_OF[pos]:
+            if values[i] or (candidates[i] | struck[i]) & bit:
+                continue
+            r, c, h = UNITS_OF[i]
+            if not (masks[r] | masks[c] | masks[h]) & bit:
+                candidates[i] |= bit
+                touched.add(i)
+
+    def _update_candidates(self, pos, old: int, val: int):
+        # placing a value is the common case, so it clears the bit over the
+        # whole region in one go instead of testing each peer
+        if old == val:
+            return
+        if old:
+            self.update_candidates_removal(pos, old)
+        region = REGION_OF[pos]
+        if val:
+            clear = ~(1 << val)
+            candidates = self.candidates
+            for i in region:
+                candidates[i] &= clear
+            candidates[pos] = 0
+            self.candidates_touched.update(region)
+        else:
+            self.candidates[pos] = self.candidate_mask(pos) & ~self.struck[pos]
+            self.candidates_touched.add(pos)
+
+    def val_is_in_relevant_region(self, pos, val) -> bool:
+        return self.num_is_in_col_row_or_house(pos, val)
+
+    def generate_candidates(self) -> None:
+        self.struck = array('H', bytes(2 * 81))
+        candidates = self.candidates
+        for i in range(81):
+            candidates[i] = 0 if self.array[i] else self.candidate_mask(i)
+        self.candidates_touched.update(range(81))
+
+    def clear_candidates(self) -> None:
+        for i in range(81):
+            self.candidates[i] = 0
+
+    def get_candidate_bits(self, pos) -> int:
+        return self.candidates[pos]
+
+    def _write_candidates(self, pos, bits: int) -> None:
+        self.candidates[pos] = bits
+
+    def _load_grid(self, values):
+        self._clear()
+        self.array[:] = values
+        for i in range(81):
+            if values[i]:
+                self._place(i, values[i])
+
+    def __str__(self):
+        return str(list(self.array))
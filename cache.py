@@ -0,0 +1,171 @@
+"""
+A cache of generated puzzles, addressed by seed.
+
+Because a seed always produces the same puzzle, "puzzle #k" never has to be
+stored anywhere: PuzzleCache generates it on the first request and keeps the
+most recently used puzzles in a bounded LRU. Entries are keyed by
+(seed, clue count, engine.GENERATOR_VERSION), so puzzles made by an older
+generator are never served by a newer one.
+
+With prefetch set, every request also queues the next few seeds on a
+background thread, so walking through seeds in order rarely has to wait
+for the generator.
+"""
+from collections import OrderedDict, namedtuple
+import concurrent.futures
+import sys
+import threading
+from bitboard import BitBoard
+from engine import GENERATOR_VERSION
+
+CachedPuzzle = namedtuple("CachedPuzzle", "puzzle solution")
+CachedPuzzle.__doc__ = """A cached puzzle. puzzle and solution are 81-byte
+bytes objects, with 0 for the blanks of the puzzle."""
+
+# What the OrderedDict spends on each entry besides its key and value: a
+# slot of its hash table and a node of its linked list, as measured with
+# tracemalloc on CPython.
+DICT_ENTRY_BYTES = 96
+
+
+def entry_size(key, entry: CachedPuzzle) -> int:
+    """Return the bytes one cache entry holds: its key and the ints in it,
+    the CachedPuzzle and its two bytes objects, and its share of the
+    OrderedDict."""
+    return (
+        sys.getsizeof(key) + sum(map(sys.getsizeof, key))
+        + sys.getsizeof(entry) + sys.getsizeof(entry.puzzle)
+        + sys.getsizeof(entry.solution) + DICT_ENTRY_BYTES
+    )
+
+
+class PuzzleCache:
+    """An LRU cache in front of generate_puzzle.
+    max_entries and max_bytes bound the cache, counting each entry as
+    entry_size bytes; the least recently used puzzles are evicted as soon
+    as either is exceeded.
+    prefetch is the number of following seeds to generate in the
+    background after each request.
+    unique selects generate_unique_puzzle instead of generate_puzzle.
+    hits, misses, and evictions count what the cache has done."""
+    def __init__(self, max_entries: int = 1024, max_bytes: int = 1 << 20,
+                 prefetch: int = 0, unique: bool = False,
+                 board_class=BitBoard) -> None:
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.prefetch = prefetch
+        self.unique = unique
+        self.board_class = board_class
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size_bytes = 0
+
+        self._entries = OrderedDict()
+        # keys being generated in the background, mapped to their futures
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._executor = None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def key(self, seed: int, clues: int):
+        return (seed, clues, GENERATOR_VERSION)
+
+    def get(self, seed: int, clues: int) -> CachedPuzzle:
+        """Return the puzzle for seed, generating it if it is not cached."""
+        key = self.key(seed, clues)
+        future = None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+            else:
+                self.misses += 1
+                future = self._pending.get(key)
+        if entry is None:
+            if future is not None:
+                # already being prefetched; wait rather than generate twice
+                entry = future.result()
+            else:
+                entry = self._generate(seed, clues)
+                self._store(key, entry)
+        if self.prefetch:
+            self._schedule(seed, clues)
+        return entry
+
+    def load(self, seed: int, clues: int, board) -> CachedPuzzle:
+        """Load the puzzle for seed into board, setting its array, clues,
+        and solution. Returns the cached puzzle."""
+        entry = self.get(seed, clues)
+        board.load_puzzle(entry.puzzle, entry.solution)
+        return entry
+
+    def _generate(self, seed: int, clues: int) -> CachedPuzzle:
+        board = self.board_class(seed=seed)
+        if self.unique:
+            board.generate_unique_puzzle(clues)
+        else:
+            board.generate_puzzle(clues)
+        return CachedPuzzle(
+            bytes(int(v) for v in board.array),
+            board.solution,
+        )
+
+    def _store(self, key, entry: CachedPuzzle):
+        size = entry_size(key, entry)
+        with self._lock:
+            if key in self._entries:
+                return
+            self._entries[key] = entry
+            self.size_bytes += size
+            # the newest entry always stays, even if it alone is too big
+            while len(self._entries) > 1 and (
+                len(self._entries) > self.max_entries
+                or self.size_bytes > self.max_bytes
+            ):
+                old_key, old = self._entries.popitem(last=False)
+                self.size_bytes -= entry_size(old_key, old)
+                self.evictions += 1
+
+    def _schedule(self, seed: int, clues: int):
+        """Queue the next self.prefetch seeds for background generation."""
+        with self._lock:
+            if self._executor is None:
+                self._executor = concurrent.futures.ThreadPoolExecutor(
+                    max_workers=1, thread_name_prefix="puzzle-prefetch"
+                )
+            for next_seed in range(seed + 1, seed + 1 + self.prefetch):
+                key = self.key(next_seed, clues)
+                if key in self._entries or key in self._pending:
+                    continue
+                self._pending[key] = self._executor.submit(
+                    self._prefetch_one, key, next_seed, clues
+                )
+
+    def _prefetch_one(self, key, seed: int, clues: int) -> CachedPuzzle:
+        try:
+            entry = self._generate(seed, clues)
+            self._store(key, entry)
+            return entry
+        finally:
+            with self._lock:
+                self._pending.pop(key, None)
+
+    def close(self):
+        """Stop the prefetch thread, dropping any seeds still queued."""
+        if self._executor is not None:
+            self._executor.shutdown(wait=True, cancel_futures=True)
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,18 +1,238 @@
+from array import array
 import random
+import time
 from square import Square
+from symmetry import canonical_form
+
+# Bump whenever a change to the generator makes a seed produce a different
+# puzzle, so that anything keyed by seed can tell old puzzles from new ones.
+GENERATOR_VERSION = 3
+
+# Static lookup tables, built once at import time. Rows, columns, and houses
+# are numbered 0 - 8 here; houses run left to right, top to bottom.
+ROW_OF = tuple(i // 9 for i in range(81))
+COL_OF = tuple(i % 9 for i in range(81))
+HOUSE_OF = tuple((i // 27) * 3 + (i % 9) // 3 for i in range(81))
+
+ROW_CELLS = tuple(tuple(range(r * 9, r * 9 + 9)) for r in range(9))
+COL_CELLS = tuple(tuple(range(c, 81, 9)) for c in range(9))
+HOUSE_CELLS = tuple(
+    tuple(i for i in range(81) if HOUSE_OF[i] == h) for h in range(9)
+)
+
+# The 27 units, numbered rows 0 - 8, columns 9 - 17, and houses 18 - 26,
+# and the three units that every cell belongs to.
+UNIT_CELLS = ROW_CELLS + COL_CELLS + HOUSE_CELLS
+UNITS_OF = tuple(
+    (ROW_OF[i], 9 + COL_OF[i], 18 + HOUSE_OF[i]) for i in range(81)
+)
+
+# PEERS_OF[i] holds the 20 cells that share a row, column, or house with i.
+# REGION_OF[i] is the relevant region of i: its peers plus i itself.
+PEERS_OF = tuple(
+    tuple(
+        j for j in range(81) if j != i and (
+            ROW_OF[j] == ROW_OF[i] or COL_OF[j] == COL_OF[i]
+            or HOUSE_OF[j] == HOUSE_OF[i]
+        )
+    )
+    for i in range(81)
+)
+REGION_OF = tuple(tuple(sorted(PEERS_OF[i] + (i,))) for i in range(81))
+
+# Bits 1 through 9; bit 0 is never used so that digit v maps to 1 << v.
+ALL_DIGITS = 0b1111111110
+
+# MASK_DIGITS[m] is the tuple of digits whose bits are set in mask m.
+MASK_DIGITS = tuple(
+    tuple(d for d in range(1, 10) if m >> d & 1) for m in range(1 << 10)
+)
+
+# The phases of generating a puzzle, as timed by GeneratorStats.
+PHASES = ("fill", "validate", "holes")
+
+
+class Tracer:
+    """Receives events from an instrumented board. Override the methods
+    you need; the rest do nothing.
+    on_node is called each time the filler picks a value for pos, and
+    on_backtrack each time that value led to a dead end. on_phase is
+    called with the seconds a phase of generation took."""
+    def on_node(self, pos: int, val: int) -> None:
+        pass
+
+    def on_backtrack(self, pos: int) -> None:
+        pass
+
+    def on_phase(self, phase: str, seconds: float) -> None:
+        pass
+
+
+class GeneratorStats:
+    """Counters collected by an instrumented board, summed over every
+    puzzle it generates until instrument() is called again.
+    nodes: values tried by the filler.
+    backtracks: values that led to a dead end and were taken back.
+    max_depth: the most cells the filler had placed at once.
+    candidate_computations: the times the filler computed candidates.
+    uniqueness_checks: the removals tested by generate_unique_puzzle.
+    attempts: fills started; generate_unique_puzzle may need several.
+    puzzles: puzzles finished.
+    phase_times: seconds spent in each of PHASES."""
+    def __init__(self, tracer: Tracer = None) -> None:
+        self.tracer = tracer
+        self.nodes = 0
+        self.backtracks = 0
+        self.max_depth = 0
+        self.candidate_computations = 0
+        self.uniqueness_checks = 0
+        self.attempts = 0
+        self.puzzles = 0
+        self.phase_times = dict.fromkeys(PHASES, 0.0)
+
+    def expand(self, depth: int):
+        """The filler picked its next cell with depth cells placed."""
+        self.candidate_computations += 1
+        if depth > self.max_depth:
+            self.max_depth = depth
+
+    def node(self, pos: int, val: int):
+        self.nodes += 1
+        if self.tracer is not None:
+            self.tracer.on_node(pos, val)
+
+    def backtrack(self, pos: int):
+        self.backtracks += 1
+        if self.tracer is not None:
+            self.tracer.on_backtrack(pos)
+
+    def phase(self, phase: str, start: float) -> float:
+        """Charge the time since start to phase and return the time now."""
+        now = time.perf_counter()
+        self.phase_times[phase] += now - start
+        if self.tracer is not None:
+            self.tracer.on_phase(phase, now - start)
+        return now
+
+    def as_dict(self) -> dict:
+        """The counters as a plain dict, for logging."""
+        return {
+            "nodes": self.nodes,
+            "backtracks": self.backtracks,
+            "max_depth": self.max_depth,
+            "candidate_computations": self.candidate_computations,
+            "uniqueness_checks": self.uniqueness_checks,
+            "attempts": self.attempts,
+            "puzzles": self.puzzles,
+            "phase_times": dict(self.phase_times),
+        }
+
+    def __repr__(self):
+        return f"GeneratorStats({self.as_dict()})"
+
+def fill_grid(rng: random.Random, stats: GeneratorStats = None) -> bytearray:
+    """Return the 81 values of a random, completely filled grid.
+
+    The search is iterative, with an explicit stack. The next cell is always
+    a blank with the fewest candidates, and its value is drawn at random
+    from those candidates. Candidate masks are updated as values are placed,
+    so a placement that leaves any peer without candidates is taken back at
+    once instead of being found several cells later."""
+    # candidates[i] is 0 once i is filled, so placements skip filled peers
+    candidates = [ALL_DIGITS] * 81
+    remaining = [9] * 81
+    values = bytearray(81)
+    blanks = list(range(81))
+    random = rng.random
+    # (pos, its candidates, values still to try, peers that lost the value)
+    stack = []
+
+    pos = 0
+    options = list(MASK_DIGITS[ALL_DIGITS])
+    if stats is not None:
+        stats.expand(0)
+    while True:
+        if not options:
+            # every value at pos failed; undo the placement before it
+            if not stack:
+                raise ValueError("Grid cannot be filled")
+            pos, mask, options, removed = stack.pop()
+            bit = 1 << values[pos]
+            for p in removed:
+                candidates[p] |= bit
+                remaining[p] += 1
+            candidates[pos] = mask
+            values[pos] = 0
+            blanks.append(pos)
+            if stats is not None:
+                stats.backtrack(pos)
+            continue
+
+        if len(options) == 1:
+            val = options.pop()
+        else:
+            val = options.pop(int(random() * len(options)))
+        if stats is not None:
+            stats.node(pos, val)
+        bit = 1 << val
+        removed = [p for p in PEERS_OF[pos] if candidates[p] & bit]
+        dead = False
+        single = -1
+        for p in removed:
+            candidates[p] ^= bit
+            n = remaining[p] - 1
+            remaining[p] = n
+            if n == 1:
+                single = p
+            elif not n:
+                dead = True
+        if dead:
+            # forward check: some peer has nothing left, try the next value
+            for p in removed:
+                candidates[p] |= bit
+                remaining[p] += 1
+            if stats is not None:
+                stats.backtrack(pos)
+            continue
+
+        values[pos] = val
+        stack.append((pos, candidates[pos], options, removed))
+        candidates[pos] = 0
+        blanks.remove(pos)
+        if not blanks:
+            return values
+        # a peer just left with one candidate is as constrained as any blank
+        # can be, so the scan for the fewest candidates can be skipped
+        pos = single if single >= 0 else min(blanks, key=remaining.__getitem__)
+        options = list(MASK_DIGITS[candidates[pos]])
+        if stats is not None:
+            stats.expand(len(stack))
+
 
 class SudokuBoard:
-    def __init__(self):
+    # None unless instrument() has been called, so an uninstrumented board
+    # pays one attribute check per filler step and per phase.
+    stats = None
+    # True once track_candidates() has been called; see there.
+    tracking = False
+
+    def __init__(self, seed=None, rng: random.Random = None):
         # initialize a blank array with 81 values
         # self.array will store the puzzle
         self.array = [Square() for _ in range(81)]
 
-        # Clues, an array of ints, stores the indices of all the clues 
-        # in the puzzle. These indices are randomly generated. 
-        self.clues = []
+        # Every random draw goes through self.random, so a given seed always
+        # produces the same puzzles. Pass rng to share a generator, or seed
+        # to make a private one; with neither, the board seeds itself.
+        self.random = rng if rng is not None else random.Random(seed)
 
-        self.is_valid: bool= True
-        self.solution = []
+        # given[i] is 1 if index i is a clue, and bit i of clue_mask is set
+        # along with it. self.clues lists the same indices.
+        self._reset_clues()
+
+        # the filled grid as 81 immutable bytes, once there is one
+        self.solution = b''
+        self._reset_counts()
     
     houses = {
         1: (0, 1, 2, 9, 10, 11, 18, 19, 20),
@@ -41,10 +261,7 @@ class SudokuBoard:
         Returns True if 'num' is in the row that contains 'pos'.
         Returns False otherwise.
         """
-        for i in range(self.find_row(pos), self.find_row(pos) + 9 ):
-            if self.array[i] == num:
-                return True
-        return False
+        return self.counts[ROW_OF[pos] * 10 + num] > 0
 
     def find_col(self, pos):
         """
@@ -56,11 +273,7 @@ class SudokuBoard:
         Returns True if 'num' is in the column that pos belongs to. 
         Returns False otherwise.
         """
-        col = pos % 9
-        for row in range(0, 9):
-            if self.array[row * 9 + col ] == num:
-                return True
-        return False
+        return self.counts[(9 + COL_OF[pos]) * 10 + num] > 0
     
     def num_is_in_house(self, pos: int, num: int):
         """
@@ -68,31 +281,26 @@ class SudokuBoard:
         belongs to.
         Returns False otherwise.
         """
-        house = self.find_house(pos)
-        for i in self.houses[house]:
-            if self.array[i] == num:
-                return True
-        return False
+        return self.counts[(18 + HOUSE_OF[pos]) * 10 + num] > 0
        
     def find_house(self, pos: int):
         """
         Returns the the house (1 - 9) that the index 
         pos belongs to. 
         """
-        for h in self.houses:
-            if pos in self.houses[h]:
-                return h
-        return -1 # if the position does not have a house ... so sad 
+        if pos < 0 or pos > 80:
+            return -1 # if the position does not have a house ... so sad 
+        return HOUSE_OF[pos] + 1
 
     def get_random_position(self):
-        rand = random.randint(0, 80)
-        while rand in self.clues:
-            rand = random.randint(0, 80)
-        self.clues.append(rand)
+        rand = self.random.randint(0, 80)
+        while self.given[rand]:
+            rand = self.random.randint(0, 80)
+        self._add_clue(rand)
         return rand
 
     def get_random_value(self):
-        return random.randint(1, 9)
+        return self.random.randint(1, 9)
     
     def num_is_in_col_row_or_house(self, pos: int, num: int):
         return self.num_is_in_col(pos, num) or self.num_is_in_row(pos, num) \
@@ -103,7 +311,7 @@ class SudokuBoard:
         value = self.get_random_value()
         while self.num_is_in_col_row_or_house(pos, value):
             value = self.get_random_value() # reassign 'value' from the outer scope
-        self.array[pos].value = value
+        self.set_value(pos, value)
 #Square ^
 
     def generate_clues(self, level: int):
@@ -119,25 +327,9 @@ class SudokuBoard:
 
     def find_negaters(self, pos: int):
         negaters = set()
-
-        # check the row
-        row = self.find_row(pos)
-        for c in range(row, row+9):
-            if self.array[c] != 0:
-                negaters.add(self.array[c].value)
-
-        # check the column
-        col = self.find_col(pos)
-        for r in range(0, 9):
-            if self.array[r * 9 + col] != 0:
-                negaters.add(self.array[r * 9 + col].value)
-                
-        # check house
-        house = self.find_house(pos)
-        for h in self.houses[house]:
-            if self.array[h] != 0:
-                negaters.add(self.array[h].value)
-
+        for i in REGION_OF[pos]:
+            if self.array[i] != 0:
+                negaters.add(int(self.array[i]))
         return negaters
 
     def find_candidates(self, pos) -> set:
@@ -145,27 +337,10 @@ class SudokuBoard:
         return {1, 2, 3, 4, 5, 6, 7, 8, 9} - negaters
 
 
-    def find_relevant_region(self, pos) -> set:
-        # Set is used here beccause we do not want duplicates, and order 
-        # does not matter.
-        relevant_region = set()
-
-        # add all row indices
-        row = self.find_row(pos)
-        for i in range(row, row+9):
-            relevant_region.add(i)
-
-        # add all column indices
-        col = self.find_col(pos)
-        for c in range(col, col+73, 9):
-            relevant_region.add(c)
-
-        # add all house indices
-        house = self.find_house(pos)
-        for h in self.houses[house]:
-            relevant_region.add(h)
-
-        return relevant_region
+    def find_relevant_region(self, pos) -> tuple:
+        """Returns the indices of the row, column, and house of pos, 
+        including pos itself. The tuple is shared, so do not modify it."""
+        return REGION_OF[pos]
 
     
     def update_candidates_new(self, pos, val) -> None:
@@ -174,17 +349,30 @@ class SudokuBoard:
         should be checked to see if the added value is a candidate. If it is,
         it should be removed as a candidate from that square.
         """
-        rel = self.find_relevant_region(pos)
-        for i in rel:
-            # using set.discard removes the value if it is present, 
-            # and does nothing if it is not. 
-            self.array[i].candidates.discard(val)
+        touched = self.candidates_touched
+        for i in REGION_OF[pos]:
+            candidates = self.array[i].candidates
+            if val in candidates:
+                candidates.discard(val)
+                touched.add(i)
 
     def update_candidates_removal(self, pos, val) -> None:
-        rel = self.find_relevant_region(pos)
-        for i in rel:
-            if not self.val_is_in_relevant_region(i, val):
-                self.array[i].candidates.add(val)
+        """Give val back to every empty square in the relevant region of pos
+        that no longer sees it, unless it was struck out by hand. The unit
+        masks answer "no longer sees it" directly, so this is one pass over
+        the region."""
+        bit = 1 << val
+        masks = self.unit_masks
+        struck = self.struck
+        touched = self.candidates_touched
+        for i in REGION_OF[pos]:
+            square = self.array[i]
+            if square.value or struck[i] & bit:
+                continue
+            r, c, h = UNITS_OF[i]
+            if not (masks[r] | masks[c] | masks[h]) & bit:
+                square.candidates.add(val)
+                touched.add(i)
 
     def val_is_in_relevant_region(self, pos, val) -> bool:
         rel = self.find_relevant_region(pos)
@@ -196,105 +384,353 @@ class SudokuBoard:
 
     def generate_candidates(self) -> None:
         """
-        This method finds candidates for each square and adds those 
-        candidates to the square. It does not remove existing candidates
-        from the squares, so it should be used only on a board with no 
-        candidates.
+        This method finds the candidates of every empty square from scratch,
+        replacing whatever candidates the squares had. Filled squares get
+        none, and any candidates struck out by hand come back.
         """
+        self.struck = array('H', bytes(2 * 81))
         for i in range(81):
-            self.array[i].candidates |= self.find_candidates(i)
+            self._write_candidates(i, 0 if self.array[i].value else self.candidate_mask(i))
+        self.candidates_touched.update(range(81))
 
     def clear_candidates(self) -> None:
         for square in self.array:
             square.candidates.clear()
 
+    def occupied_mask(self, pos: int) -> int:
+        """Return the mask of every digit found in the relevant region of
+        pos."""
+        masks = self.unit_masks
+        r, c, h = UNITS_OF[pos]
+        return masks[r] | masks[c] | masks[h]
+
+    def candidate_mask(self, pos: int) -> int:
+        """Return the mask of every digit that could be placed at pos."""
+        return ~self.occupied_mask(pos) & ALL_DIGITS
+
+    def markable_mask(self, pos: int) -> int:
+        """Return the mask of the candidates pos can hold while they are
+        tracked: none once it has a value, and otherwise the digits no
+        peer blocks."""
+        if int(self.array[pos]):
+            return 0
+        return self.candidate_mask(pos)
+
+    def get_candidate_bits(self, pos) -> int:
+        """Return the candidates of pos as a mask, with bit v set for each
+        candidate v."""
+        bits = 0
+        for v in self.array[pos].candidates:
+            bits |= 1 << v
+        return bits
+
+    def set_candidate_bits(self, pos, bits: int) -> None:
+        """Replace the candidates of pos with those set in bits. Digits that
+        could go at pos but are left out count as struck out by hand, so
+        removing a value elsewhere does not bring them back. While the
+        candidates are tracked, bits is cut down to markable_mask, since
+        set_value rebuilds the candidates from that and could not give the
+        rest back."""
+        possible = self.markable_mask(pos)
+        if self.tracking:
+            bits &= possible
+        self._write_candidates(pos, bits)
+        # strikes of digits a peer blocks for now are kept for when it goes
+        self.struck[pos] = self.struck[pos] & ~possible | possible & ~bits
+        self.candidates_touched.add(pos)
+
+    def _write_candidates(self, pos, bits: int) -> None:
+        self.array[pos].candidates = set(MASK_DIGITS[bits])
+
+    def track_candidates(self, on: bool = True):
+        """Keep every square's candidates up to date as values are set and
+        removed, starting from a fresh generate_candidates. Each edit only
+        touches the relevant region of the square that changed, and every
+        square whose candidates may have changed is added to candidates_touched, for
+        the caller to drain. Off by default, so generation does not pay for
+        it."""
+        self.tracking = on
+        if on:
+            self.generate_candidates()
+
+    def _update_candidates(self, pos, old: int, val: int):
+        """Bring the candidates up to date after pos changed from old to
+        val. Called by set_value once the unit masks are current."""
+        if old == val:
+            return
+        if old:
+            self.update_candidates_removal(pos, old)
+        if val:
+            self.update_candidates_new(pos, val)
+            self._write_candidates(pos, 0)
+        else:
+            self._write_candidates(pos, self.candidate_mask(pos) & ~self.struck[pos])
+        self.candidates_touched.add(pos)
+
     def __str__(self):
         return str(self.array)
 
     def update_validity_insertion(self, pos: int, val:int):
-        relevant_indices = self.find_relevant_region(pos)
-        for i in relevant_indices:
-            if self.array[i] == val:
-                self.is_valid = False
-                return False
-        return True
+        """Return True if val could be placed at pos without creating a
+        conflict. Validity itself is tracked by set_value, so this no longer
+        changes is_valid."""
+        return not self.num_is_in_col_row_or_house(pos, val)
 
     def update_validity_removal(self, pos):
-        """Check the relevant region given by pos. If it was formerly invalid,
-        update it if it is no longer invalid. Otherwise, deletion will never
-        make a board invalid."""
-        if not self.is_valid:
-            if self.region_is_valid(pos):
-                self.is_valid = True
+        """Kept for older callers. set_value and remove_value keep the
+        conflict index up to date, so there is nothing left to do here."""
 
-    
-    def region_is_valid(self, pos: int):
-        """Check if the relevant region given by pos contains duplicates. 
-        Return True if there are no duplicates. False otherwise."""
-        relevant_indices = self.find_relevant_region(pos)
-        relevant_indices.remove(pos)
-        for i in relevant_indices:
-            if self.array[i] == self.array[pos]:
-                return False
-        return True
+    @property
+    def is_valid(self) -> bool:
+        """True if no digit appears twice in any row, column, or house."""
+        return self.conflict_count == 0
 
-    def fill_puzzle(self):
-        self.recursively_fill(0)
-        self.solution = self.array # is this a shallow or deep copy? shallow copy
+    @property
+    def is_solved(self) -> bool:
+        """True if every cell is filled and nothing conflicts."""
+        return self.filled == 81 and self.conflict_count == 0
 
-    def recursively_fill(self, i):
-        if i == 81:
-            return self.array[80].value
+    def region_is_valid(self, pos: int):
+        """Return True if the value at pos appears only once in each of its
+        row, column, and house. Empty squares are always valid."""
+        return self.cell_conflicts[pos] == 0
+
+    def _reset_counts(self):
+        """Empty the conflict index. Called whenever the array is reset."""
+        # counts[unit * 10 + v] is the number of times v appears in the unit
+        self.counts = bytearray(27 * 10)
+        # the number of extra copies of a digit across all units; a digit
+        # found three times in one row adds 2
+        self.conflict_count = 0
+        # cell_conflicts[i] is the number of units in which the value at i
+        # is duplicated, and conflicting holds every i where it is non-zero
+        self.cell_conflicts = bytearray(81)
+        self.conflicting = set()
+        self.filled = 0
+        # the number of filled squares that differ from the solution
+        self.error_count = 0
+        # unit_masks[unit] has bit v set while v appears in the unit
+        self.unit_masks = array('H', bytes(2 * 27))
+        # struck[i] holds the candidates of i struck out by hand, and
+        # candidates_touched the squares whose candidates changed since the
+        # caller last cleared it
+        self.struck = array('H', bytes(2 * 81))
+        self.candidates_touched = set()
+
+    def _mark(self, pos: int, delta: int):
+        n = self.cell_conflicts[pos] + delta
+        self.cell_conflicts[pos] = n
+        if n:
+            self.conflicting.add(pos)
         else:
-            self.array[i].candidates.clear()
-            candidates = list(self.find_candidates(i))
-            if len(candidates) == 0:
-                return 0
-            else:
-                self.array[i].value = candidates.pop(random.randint(0, len(candidates)-1))
-            while self.recursively_fill(i+1) == 0:
-                if len(candidates) == 0:
-                    self.array[i].value = 0
-                    return 0
-                else:
-                    self.array[i].value = candidates.pop(random.randint(0, len(candidates)-1))
-            return self.array[i].value
+            self.conflicting.discard(pos)
+
+    def _partner(self, unit: int, pos: int, val: int):
+        """Return the cell other than pos holding val in unit. Only called
+        when val is known to be there exactly twice."""
+        for i in UNIT_CELLS[unit]:
+            if i != pos and self.array[i] == val:
+                return i
+
+    def _place(self, pos: int, val: int):
+        """Count val at pos in each of its units. Only the units that end
+        up with a duplicate cost more than an increment."""
+        bit = 1 << val
+        counts = self.counts
+        masks = self.unit_masks
+        self.filled += 1
+        for unit in UNITS_OF[pos]:
+            k = unit * 10 + val
+            counts[k] += 1
+            masks[unit] |= bit
+            if counts[k] > 1:
+                self._duplicate(pos, unit, val, 1)
+
+    def _unplace(self, pos: int, val: int):
+        """Undo _place. pos may already hold its new value."""
+        counts = self.counts
+        masks = self.unit_masks
+        self.filled -= 1
+        for unit in UNITS_OF[pos]:
+            k = unit * 10 + val
+            if counts[k] > 1:
+                self._duplicate(pos, unit, val, -1)
+            counts[k] -= 1
+            if not counts[k]:
+                masks[unit] &= ~(1 << val)
+
+    def _duplicate(self, pos: int, unit: int, val: int, delta: int):
+        """Add (delta 1) or take back (delta -1) a duplicate of val at pos
+        in unit, where val is counted at least twice."""
+        self.conflict_count += delta
+        self._mark(pos, delta)
+        if self.counts[unit * 10 + val] == 2:
+            self._mark(self._partner(unit, pos, val), delta)
+
+    def instrument(self, tracer: Tracer = None) -> GeneratorStats:
+        """Start collecting GeneratorStats, which are returned and kept in
+        self.stats. tracer, if given, is told about every step as well.
+        Calling this again starts over from zero."""
+        self.stats = GeneratorStats(tracer)
+        return self.stats
+
+    def uninstrument(self):
+        """Stop collecting stats."""
+        self.stats = None
+
+    def _start_timer(self) -> float:
+        return time.perf_counter() if self.stats is not None else 0.0
+
+    def fill_puzzle(self):
+        values = fill_grid(self.random, self.stats)
+        self._load_grid(values)
+        if self.tracking:
+            self.generate_candidates()
+        self._set_solution(values)
+
+    def _set_solution(self, solution):
+        """Keep solution, any sequence of 81 values, as a bytes snapshot,
+        so later changes to the board cannot reach it."""
+        if not isinstance(solution, bytes):
+            solution = bytes(int(v) for v in solution)
+        if len(solution) != 81:
+            raise ValueError("A solution has 81 values")
+        self.solution = solution
+        self.error_count = sum(
+            1 for i in range(81)
+            if int(self.array[i]) and int(self.array[i]) != solution[i]
+        )
+
+    def is_correct(self, pos) -> bool:
+        """Return True if the value at pos matches the solution. Blanks are
+        never correct."""
+        if not self.solution:
+            raise ValueError("Board has no solution")
+        return int(self.array[pos]) == self.solution[pos]
+
+    def reveal(self, pos) -> int:
+        """Set pos to its value in the solution and return it."""
+        if not self.solution:
+            raise ValueError("Board has no solution")
+        val = self.solution[pos]
+        self.set_value(pos, val)
+        return val
 
     def test_filled_puzzle_is_valid(self):
         for i in range(81):
             if not self.region_is_valid(i):
-                print("Puzzle invalid; problem at index", i)
                 raise ValueError(f"Puzzle invalid; problem at index {i}")
-        print("Valid puzzle")
 
     def remove_clues(self, holes: int):
         """Remove the number of clues specified by holes."""
         # get the indices for removal
-        indices = random.sample(range(81), holes)
+        indices = self.random.sample(range(81), holes)
         for i in indices:
-            self.array[i].value = 0
+            self.remove_value(i)
+            if self.given[i]:
+                self.given[i] = 0
+                self.clue_mask &= ~(1 << i)
     
     def set_clue_array(self):
         """To be called immediately after poking holes. 
-        Zips through the array, adds the index of any non-zero value
-        to the self.clues array."""
+        Zips through the array and marks the index of any non-zero value
+        as a clue."""
         for i in range(len(self.array)):
             if self.array[i] != 0:
-                self.clues.append(i)
+                self._add_clue(i)
+
+    @property
+    def clues(self) -> tuple:
+        """The indices of the clues, in order. Derived from given, so it
+        cannot be changed directly."""
+        given = self.given
+        return tuple(i for i in range(81) if given[i])
+
+    def is_clue(self, pos: int) -> bool:
+        return bool(self.given[pos])
+
+    def _add_clue(self, pos: int):
+        self.given[pos] = 1
+        self.clue_mask |= 1 << pos
+
+    def _reset_clues(self, clues=()):
+        """Make exactly the indices in clues the clues."""
+        self.given = bytearray(81)
+        self.clue_mask = 0
+        for i in clues:
+            self._add_clue(i)
     
     def remove_value(self, pos):
         """Remove the value from the array by setting it to zero."""
-        self.array[pos].value = 0
+        self.set_value(pos, 0)
     
     def set_value(self, pos, val):
-        """Set the value at the given position."""
+        """Set the value at the given position, keeping the conflict index
+        in step."""
+        old = int(self.array[pos])
+        # the Square setter validates val before anything is counted
         self.array[pos].value = val
+        if old:
+            self._unplace(pos, old)
+        if val:
+            self._place(pos, val)
+        solution = self.solution
+        if solution:
+            right = solution[pos]
+            self.error_count += (val and val != right) - (old and old != right)
+        if self.tracking:
+            self._update_candidates(pos, old, val)
     
     def _clear(self):
         """resets the puzzle array to empty"""
         self.array = [Square() for _ in range(81)]
-        self.clues = []
-        self.solution =[]
+        self._reset_clues()
+        self.solution = b''
+        self._reset_counts()
+        if self.tracking:
+            self.generate_candidates()
+
+    def _load_grid(self, values):
+        """Clear the board and fill it with 81 values from 0 to 9 that are
+        already known to be in range, skipping set_value's checks."""
+        self._clear()
+        self.array = [Square(v) for v in values]
+        for i in range(81):
+            if values[i]:
+                self._place(i, values[i])
+
+    def load_puzzle(self, puzzle, solution=None):
+        """Replace the board with the given puzzle, a sequence of 81 values
+        where 0 is a blank. Every non-zero value becomes a clue."""
+        if not isinstance(puzzle, bytes):
+            puzzle = bytes(int(v) for v in puzzle)
+        if len(puzzle) != 81 or max(puzzle) > 9:
+            raise ValueError("A puzzle has 81 values within [0, 9]")
+        self._load_grid(puzzle)
+        self.set_clue_array()
+        if self.tracking:
+            self.generate_candidates()
+        if solution is not None:
+            self._set_solution(solution)
+
+    def apply_transform(self, transform):
+        """Rewrite the board under transform, a symmetry.Transform. The
+        values, clues, and solution all move together; candidates are
+        dropped."""
+        clues = self.clues
+        solution = None
+        if self.solution:
+            solution = transform.apply(self.solution)
+        self.load_puzzle(transform.apply(int(v) for v in self.array), solution)
+        self._reset_clues(transform.apply_clues(clues))
+
+    def canonical_form(self) -> bytes:
+        """Return symmetry.canonical_form of the clues, ignoring any other
+        values entered since. Equivalent puzzles give equal results."""
+        clues = bytearray(81)
+        for i in self.clues:
+            clues[i] = int(self.array[i])
+        return canonical_form(clues)
 
     def generate_puzzle(self, number_of_clues):
         """Abstraction of the steps required to reach a puzzle.
@@ -303,13 +739,71 @@ class SudokuBoard:
             2. poke holes
             3. set the clue array
         number_of_clues represents the desired number of clues in the puzzle."""
+        stats = self.stats
+        start = self._start_timer()
         self._clear()
         self.fill_puzzle()
+        if stats is not None:
+            stats.attempts += 1
+            start = stats.phase("fill", start)
         self.test_filled_puzzle_is_valid()
+        if stats is not None:
+            start = stats.phase("validate", start)
         self.remove_clues(81 - number_of_clues)
         self.set_clue_array()
-
-
-
-
-
+        if stats is not None:
+            stats.phase("holes", start)
+            stats.puzzles += 1
+
+    def generate_unique_puzzle(self, number_of_clues, max_attempts=20):
+        """Like generate_puzzle, but the puzzle is guaranteed to have exactly 
+        one solution. Clues are removed one at a time in random order, and a 
+        removal is kept only if the puzzle stays unique. 
+        A single pass usually bottoms out at 23 - 26 clues, so lower targets 
+        may need a fresh fill; up to max_attempts fills are tried, and if 
+        none reaches the target the one with the fewest clues is kept. 
+        Returns the number of clues in the final puzzle."""
+        # solver imports its tables from this module, so it is imported here
+        from solver import UniquenessChecker
+        stats = self.stats
+        best = None
+        best_clues = 82
+        for _ in range(max_attempts):
+            start = self._start_timer()
+            self._clear()
+            self.fill_puzzle()
+            if stats is not None:
+                stats.attempts += 1
+                start = stats.phase("fill", start)
+            self.test_filled_puzzle_is_valid()
+            if stats is not None:
+                start = stats.phase("validate", start)
+            checker = UniquenessChecker(self.array)
+            clues = 81
+            checks = 0
+            for pos in self.random.sample(range(81), 81):
+                if clues == number_of_clues:
+                    break
+                checker.remove(pos)
+                checks += 1
+                if checker.has_other_solution(pos):
+                    checker.restore(pos)
+                else:
+                    self.remove_value(pos)
+                    clues -= 1
+            if stats is not None:
+                stats.uniqueness_checks += checks
+                stats.phase("holes", start)
+            if clues <= number_of_clues:
+                break
+            if clues < best_clues:
+                best_clues = clues
+                best = (bytes(int(v) for v in self.array), self.solution)
+        if best is not None and best_clues < clues:
+            clues = best_clues
+            self.load_puzzle(*best)
+        else:
+            self.set_clue_array()
+        if stats is not None:
+            stats.puzzles += 1
+        return clues
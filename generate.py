@@ -0,0 +1,171 @@
+"""
+Headless batch puzzle generation, for when no window is needed:
+
+    python generate.py --count 100000 --clues 30 --workers 4 --seed 1
+
+Puzzles are generated in chunks spread across a process pool. Every puzzle
+seeds the board's random number generator from --seed and its own number,
+so a seed always produces the same puzzles no matter how many workers run.
+Chunks are written as soon as they finish, one puzzle per line: 81 digits
+with 0 for the blanks, followed by a space and the solution if --solutions
+is given. With --bank, the puzzles are appended to a puzzle bank file
+instead (see puzzlebank.py), graded by grader.py if --grade is given. Only
+a few chunks are in flight at a time, so memory use does not grow with
+--count.
+
+--variants N writes every generated puzzle followed by N - 1 symmetric
+variants of it (see symmetry.py), which cost microseconds instead of a
+full generation. Variants keep their base's seed and difficulty, and are
+drawn from a generator seeded by it, so they are reproducible too. A bank
+also stores the index of each variant's transform, so any record can be
+made again from its seed and transform alone. The
+grader's level is the same for every variant, but its score depends on the
+order it finds moves in and can differ from the base's by about 20%.
+"""
+import argparse
+import concurrent.futures
+import os
+import random
+import sys
+import time
+from bitboard import BitBoard
+from grader import Grader
+from puzzlebank import append_puzzles
+from puzzletext import write_puzzles
+from symmetry import Transform
+
+
+# Batch seeds and puzzle numbers each get 32 bits of a puzzle's seed.
+SEED_BITS = 32
+
+
+def puzzle_seed(seed: int, number: int) -> int:
+    """The 64-bit seed used for the given puzzle number of a batch. The
+    batch seed and the number fill separate halves, so two batches never
+    share a puzzle however long they run."""
+    limit = 1 << SEED_BITS
+    if not (0 <= seed < limit and 0 <= number < limit):
+        raise ValueError(f"seed and number are from 0 to {limit - 1}")
+    return seed << SEED_BITS | number
+
+
+def generate_chunk(first: int, size: int, clues: int, seed: int, unique: bool,
+                   grade: bool = False):
+    """Generate puzzles number first to first + size - 1. Returns a list of
+    (puzzle, solution, difficulty, seed) tuples, where puzzle and solution
+    are 81-byte bytes objects. difficulty is the grader's score, or 0 if
+    grade is False."""
+    board = BitBoard()
+    puzzles = []
+    for number in range(first, first + size):
+        this_seed = puzzle_seed(seed, number)
+        board.random.seed(this_seed)
+        if unique:
+            board.generate_unique_puzzle(clues)
+        else:
+            board.generate_puzzle(clues)
+        difficulty = 0
+        if grade:
+            # the bank stores the score in 16 bits
+            difficulty = min(Grader(board.array).grade().score, 0xFFFF)
+        puzzles.append(
+            (bytes(board.array), board.solution, difficulty, this_seed)
+        )
+    return puzzles
+
+
+def generate_batch(count: int, clues: int, workers=None, seed: int = 0,
+                   chunk_size: int = 100, unique: bool = False,
+                   grade: bool = False):
+    """Yield (puzzle, solution, difficulty, seed) tuples as the worker
+    processes finish them. They come out chunk by chunk, in the order the
+    chunks complete."""
+    chunks = (count + chunk_size - 1) // chunk_size
+    workers = workers or os.cpu_count() or 1
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool:
+        pending = set()
+        next_chunk = 0
+        while next_chunk < chunks or pending:
+            # keep every worker busy, with one chunk queued behind each
+            while next_chunk < chunks and len(pending) < workers * 2:
+                first = next_chunk * chunk_size
+                size = min(chunk_size, count - first)
+                pending.add(pool.submit(
+                    generate_chunk, first, size, clues, seed, unique, grade
+                ))
+                next_chunk += 1
+            done, pending = concurrent.futures.wait(
+                pending, return_when=concurrent.futures.FIRST_COMPLETED
+            )
+            for future in done:
+                yield from future.result()
+
+
+def expand_variants(puzzles, variants: int):
+    """Yield every (puzzle, solution, difficulty, seed, transform) tuple of
+    puzzles, each followed by variants - 1 random transforms of it.
+    transform is the index of the symmetry.Transform applied, 0 for the
+    puzzle itself."""
+    for puzzle, solution, difficulty, seed in puzzles:
+        yield puzzle, solution, difficulty, seed, 0
+        rng = random.Random(seed)
+        for _ in range(variants - 1):
+            t = Transform.random(rng)
+            yield (t.apply(puzzle), t.apply(solution), difficulty, seed,
+                   t.index())
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate sudoku puzzles in bulk.")
+    parser.add_argument("--count", type=int, default=100)
+    parser.add_argument("--clues", type=int, default=30)
+    parser.add_argument("--workers", type=int, default=None,
+                        help="number of processes (default: one per core)")
+    parser.add_argument("--seed", type=int, default=0,
+                        help="batch seed, from 0 to 2**32 - 1")
+    parser.add_argument("--chunk-size", type=int, default=100)
+    parser.add_argument("--unique", action="store_true",
+                        help="only generate puzzles with exactly one solution")
+    parser.add_argument("--grade", action="store_true",
+                        help="grade each puzzle for the bank's difficulty field")
+    parser.add_argument("--solutions", action="store_true",
+                        help="write the solution after each puzzle")
+    parser.add_argument("--output", "-o", default="-",
+                        help="file to write to (default: stdout)")
+    parser.add_argument("--bank", default=None,
+                        help="append to this puzzle bank file instead")
+    parser.add_argument("--variants", type=int, default=1,
+                        help="puzzles written per generated puzzle (default: 1)")
+    args = parser.parse_args(argv)
+    if not 0 <= args.seed < 1 << SEED_BITS:
+        parser.error(f"--seed is from 0 to {(1 << SEED_BITS) - 1}")
+    if args.count > 1 << SEED_BITS:
+        parser.error(f"--count is at most {1 << SEED_BITS}")
+
+    puzzles = generate_batch(
+        args.count, args.clues, args.workers, args.seed,
+        args.chunk_size, args.unique, args.grade
+    )
+    if args.variants > 1:
+        puzzles = expand_variants(puzzles, args.variants)
+    start = time.perf_counter()
+    if args.bank:
+        written = append_puzzles(args.bank, puzzles)
+    else:
+        written = write_text(puzzles, args.output, args.solutions)
+    elapsed = time.perf_counter() - start
+    print(f"Generated {written} puzzles in {elapsed:.2f} s "
+          f"({written / elapsed:.1f} puzzles per second)", file=sys.stderr)
+
+
+def write_text(puzzles, output, solutions: bool) -> int:
+    """Write puzzles to the file named output ('-' for stdout), one per
+    line. Returns the number of puzzles written."""
+    return write_puzzles(output, (
+        (puzzle, solution if solutions else None)
+        for puzzle, solution, *_ in puzzles
+    ))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Grades puzzles by the techniques a person would need to solve them, rather
+than by how many clues they have.
+
+The grader works on the candidate masks of a BitBoard. At every step it
+tries the techniques in TECHNIQUES from cheapest to most expensive and
+applies the first one that makes progress, then starts over from the
+cheapest. Placing a value only updates the candidates of its peers through
+update_candidates_new, so the candidates are never rebuilt from scratch.
+
+The result reports the hardest technique that was needed and a score, the
+sum of the cost of every technique application. A puzzle that cannot be
+finished with these techniques is marked unsolved and given the cost of
+trial and error on top of its score.
+"""
+from itertools import combinations
+from bitboard import BitBoard, MASK_DIGITS
+from engine import (
+    ROW_OF, COL_OF, HOUSE_OF, ROW_CELLS, COL_CELLS, HOUSE_CELLS, UNIT_CELLS,
+    PEERS_OF,
+)
+
+# (name, cost) of each technique, in the order they are tried.
+TECHNIQUES = (
+    ("naked single", 1),
+    ("hidden single", 2),
+    ("naked pair", 10),
+    ("hidden pair", 15),
+    ("naked triple", 20),
+    ("hidden triple", 25),
+    ("pointing/claiming", 30),
+    ("x-wing", 50),
+    ("swordfish", 70),
+    ("simple coloring", 100),
+)
+TRIAL_AND_ERROR = ("trial and error", 1000)
+
+# POPCOUNT[m] is the number of bits set in m, for any 10-bit mask.
+POPCOUNT = tuple(bin(m).count("1") for m in range(1 << 10))
+
+PEER_SETS = tuple(frozenset(peers) for peers in PEERS_OF)
+
+
+class Grade:
+    """The result of grading a puzzle.
+    hardest: the name of the hardest technique needed, or None if the
+        puzzle was already solved.
+    level: the index of that technique in TECHNIQUES, len(TECHNIQUES) for
+        trial and error, or -1.
+    score: the sum of the costs of every technique application.
+    solved: False if the techniques were not enough to finish the puzzle.
+    counts: how many times each technique was applied, by name."""
+    def __init__(self) -> None:
+        self.hardest = None
+        self.level = -1
+        self.score = 0
+        self.solved = False
+        self.counts = {}
+
+    def record(self, level: int, name: str, cost: int, times: int = 1):
+        self.score += cost * times
+        self.counts[name] = self.counts.get(name, 0) + times
+        if level > self.level:
+            self.level = level
+            self.hardest = name
+
+    def __repr__(self):
+        return (f"Grade(hardest={self.hardest!r}, score={self.score}, "
+                f"solved={self.solved})")
+
+
+class Grader:
+    """Grades the puzzle given by grid, a sequence of 81 values where 0 is
+    a blank. A SudokuBoard's array can be passed directly."""
+    def __init__(self, grid) -> None:
+        self.board = BitBoard()
+        for pos, val in enumerate(grid):
+            if int(val):
+                self.board.set_value(pos, int(val))
+        self.board.generate_candidates()
+        self.blanks = 0
+        for pos in range(81):
+            if self.board.array[pos]:
+                self.board.candidates[pos] = 0
+            else:
+                self.blanks += 1
+        # set when a blank square runs out of candidates
+        self.broken = False
+        self._techniques = (
+            self.naked_single,
+            self.hidden_single,
+            lambda: self.naked_subset(2),
+            lambda: self.hidden_subset(2),
+            lambda: self.naked_subset(3),
+            lambda: self.hidden_subset(3),
+            self.pointing_claiming,
+            lambda: self.fish(2),
+            lambda: self.fish(3),
+            self.simple_coloring,
+        )
+
+    def grade(self) -> Grade:
+        result = Grade()
+        while self.blanks and not self.broken:
+            for level, technique in enumerate(self._techniques):
+                times = technique()
+                if times:
+                    name, cost = TECHNIQUES[level]
+                    result.record(level, name, cost, times)
+                    break
+            else:
+                break
+        result.solved = not self.blanks and not self.broken
+        if not result.solved:
+            name, cost = TRIAL_AND_ERROR
+            result.record(len(TECHNIQUES), name, cost)
+        return result
+
+    def place(self, pos: int, val: int):
+        self.board.set_value(pos, val)
+        self.board.candidates[pos] = 0
+        self.board.update_candidates_new(pos, val)
+        self.blanks -= 1
+
+    def eliminate(self, cells, mask: int) -> bool:
+        """Remove the digits in mask from the candidates of cells. Returns
+        True if anything was removed."""
+        candidates = self.board.candidates
+        removed = False
+        for pos in cells:
+            if candidates[pos] & mask:
+                candidates[pos] &= ~mask
+                removed = True
+        return removed
+
+    def naked_single(self) -> int:
+        """Place every square that has only one candidate left."""
+        candidates = self.board.candidates
+        array = self.board.array
+        placed = 0
+        for pos, mask in enumerate(candidates):
+            if mask and not mask & (mask - 1):
+                self.place(pos, MASK_DIGITS[mask][0])
+                placed += 1
+            elif not mask and not array[pos]:
+                self.broken = True
+                return placed
+        return placed
+
+    def hidden_single(self) -> int:
+        """Place every digit that has only one possible square in its
+        unit."""
+        candidates = self.board.candidates
+        placed = 0
+        for cells in UNIT_CELLS:
+            once = 0
+            more = 0
+            for pos in cells:
+                mask = candidates[pos]
+                more |= once & mask
+                once |= mask
+            only = once & ~more
+            if only:
+                for pos in cells:
+                    mask = candidates[pos] & only
+                    if mask:
+                        self.place(pos, MASK_DIGITS[mask][0])
+                        placed += 1
+        return placed
+
+    def naked_subset(self, size: int) -> int:
+        """If size squares of a unit share exactly size candidates, no other
+        square of the unit can hold those digits."""
+        candidates = self.board.candidates
+        for cells in UNIT_CELLS:
+            blanks = [pos for pos in cells if candidates[pos]]
+            if len(blanks) <= size:
+                continue
+            small = [pos for pos in blanks if POPCOUNT[candidates[pos]] <= size]
+            for subset in combinations(small, size):
+                union = 0
+                for pos in subset:
+                    union |= candidates[pos]
+                if POPCOUNT[union] == size:
+                    others = [pos for pos in blanks if pos not in subset]
+                    if self.eliminate(others, union):
+                        return 1
+        return 0
+
+    def hidden_subset(self, size: int) -> int:
+        """If size digits of a unit fit in only size squares, those squares
+        cannot hold any other digit."""
+        candidates = self.board.candidates
+        for cells in UNIT_CELLS:
+            # spots[d] has bit k set if digit d can go in cells[k]
+            spots = [0] * 10
+            blanks = 0
+            for k, pos in enumerate(cells):
+                mask = candidates[pos]
+                if mask:
+                    blanks += 1
+                    for digit in MASK_DIGITS[mask]:
+                        spots[digit] |= 1 << k
+            if blanks <= size:
+                continue
+            digits = [d for d in range(1, 10) if 2 <= POPCOUNT[spots[d]] <= size]
+            for subset in combinations(digits, size):
+                union = 0
+                keep = 0
+                for digit in subset:
+                    union |= spots[digit]
+                    keep |= 1 << digit
+                if POPCOUNT[union] == size:
+                    squares = [cells[k] for k in range(9) if union >> k & 1]
+                    if self.eliminate(squares, ~keep & 0x3FF):
+                        return 1
+        return 0
+
+    def pointing_claiming(self) -> int:
+        """If a digit's squares in a house all lie on one line, it cannot go
+        anywhere else on that line (pointing). If a digit's squares on a
+        line all lie in one house, it cannot go anywhere else in that house
+        (claiming)."""
+        candidates = self.board.candidates
+        for digit in range(1, 10):
+            bit = 1 << digit
+            for cells in HOUSE_CELLS:
+                where = [pos for pos in cells if candidates[pos] & bit]
+                if len(where) < 2:
+                    continue
+                for line_of, line_cells in ((ROW_OF, ROW_CELLS), (COL_OF, COL_CELLS)):
+                    lines = {line_of[pos] for pos in where}
+                    if len(lines) == 1:
+                        others = [pos for pos in line_cells[lines.pop()]
+                                  if pos not in cells]
+                        if self.eliminate(others, bit):
+                            return 1
+            for cells in ROW_CELLS + COL_CELLS:
+                where = [pos for pos in cells if candidates[pos] & bit]
+                if len(where) < 2:
+                    continue
+                houses = {HOUSE_OF[pos] for pos in where}
+                if len(houses) == 1:
+                    others = [pos for pos in HOUSE_CELLS[houses.pop()]
+                              if pos not in cells]
+                    if self.eliminate(others, bit):
+                        return 1
+        return 0
+
+    def fish(self, size: int) -> int:
+        """X-Wing (size 2) and Swordfish (size 3). If a digit's squares on
+        size rows all fall in the same size columns, it cannot go anywhere
+        else in those columns; likewise with rows and columns swapped."""
+        candidates = self.board.candidates
+        for digit in range(1, 10):
+            bit = 1 << digit
+            for base_cells, base_of, cover_of, cover_cells in (
+                (ROW_CELLS, ROW_OF, COL_OF, COL_CELLS),
+                (COL_CELLS, COL_OF, ROW_OF, ROW_CELLS),
+            ):
+                # (base line, mask of the cover lines the digit can use)
+                lines = []
+                for line, cells in enumerate(base_cells):
+                    covers = 0
+                    for pos in cells:
+                        if candidates[pos] & bit:
+                            covers |= 1 << cover_of[pos]
+                    if 2 <= POPCOUNT[covers] <= size:
+                        lines.append((line, covers))
+                for subset in combinations(lines, size):
+                    union = 0
+                    for _, covers in subset:
+                        union |= covers
+                    if POPCOUNT[union] != size:
+                        continue
+                    base = {line for line, _ in subset}
+                    others = [
+                        pos for cover in range(9) if union >> cover & 1
+                        for pos in cover_cells[cover] if base_of[pos] not in base
+                    ]
+                    if self.eliminate(others, bit):
+                        return 1
+        return 0
+
+    def simple_coloring(self) -> int:
+        """Follow chains of conjugate pairs, units where a digit has exactly
+        two squares, coloring the squares alternately. If two squares of one
+        color see each other, that color is false. A square that sees both
+        colors cannot hold the digit."""
+        candidates = self.board.candidates
+        for digit in range(1, 10):
+            bit = 1 << digit
+            links = {}
+            for cells in UNIT_CELLS:
+                where = [pos for pos in cells if candidates[pos] & bit]
+                if len(where) == 2:
+                    a, b = where
+                    links.setdefault(a, []).append(b)
+                    links.setdefault(b, []).append(a)
+            seen = set()
+            for start in links:
+                if start in seen:
+                    continue
+                color = {start: 0}
+                stack = [start]
+                while stack:
+                    pos = stack.pop()
+                    for other in links[pos]:
+                        if other not in color:
+                            color[other] = 1 - color[pos]
+                            stack.append(other)
+                seen.update(color)
+                if len(color) < 3:
+                    continue
+                groups = (
+                    [pos for pos in color if color[pos] == 0],
+                    [pos for pos in color if color[pos] == 1],
+                )
+                for group in groups:
+                    if any(b in PEER_SETS[a] for a, b in combinations(group, 2)):
+                        if self.eliminate(group, bit):
+                            return 1
+                trapped = [
+                    pos for pos in range(81)
+                    if candidates[pos] & bit and pos not in color
+                    and any(p in PEER_SETS[pos] for p in groups[0])
+                    and any(p in PEER_SETS[pos] for p in groups[1])
+                ]
+                if self.eliminate(trapped, bit):
+                    return 1
+        return 0
+
+
+def grade(board) -> Grade:
+    """Grade the puzzle held by board."""
+    return Grader(board.array).grade()
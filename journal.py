@@ -0,0 +1,184 @@
+"""
+An undo/redo history of the moves made on a board.
+
+Every move changes one cell: its value, its candidates, or both. A move is
+stored as a single packed integer,
+    bits 0 - 6    the cell, 0 - 80
+    bits 7 - 10   the old value
+    bits 11 - 14  the new value
+    bits 15 - 24  the candidates that changed, as an XOR mask
+in an array of 32-bit ints, so a move costs 4 bytes and undo or redo is
+one unpack and one write. Because the candidate change is an XOR, the same
+mask takes the cell back or forward.
+
+Every checkpoint_every moves a snapshot of the whole board is kept, so
+seek() can jump to any point in the history by restoring the nearest
+snapshot and replaying at most checkpoint_every moves. Once the journal
+holds more than max_moves, the oldest moves are dropped a checkpoint at a
+time, so memory stays flat however long a game runs.
+"""
+from array import array
+
+
+def pack_move(cell: int, old: int, new: int, delta: int = 0) -> int:
+    return cell | old << 7 | new << 11 | delta << 15
+
+
+def unpack_move(move: int):
+    """Return (cell, old, new, delta) for a packed move."""
+    return move & 0x7F, move >> 7 & 0xF, move >> 11 & 0xF, move >> 15
+
+
+class MoveJournal:
+    """The move history of board. Moves made through the journal are
+    recorded; moves made on the board directly are not, so reset() the
+    journal after loading a new puzzle.
+    position is the number of moves currently applied; undo and redo move
+    it back and forth, and making a new move drops anything that could
+    have been redone."""
+    def __init__(self, board, checkpoint_every: int = 64,
+                 max_moves: int = 4096) -> None:
+        if max_moves < checkpoint_every:
+            raise ValueError("max_moves must be at least checkpoint_every")
+        self.checkpoint_every = checkpoint_every
+        self.max_moves = max_moves
+        self.reset(board)
+
+    def reset(self, board=None):
+        """Forget every move and start again from the current state of
+        board, or of the board already being journalled."""
+        if board is not None:
+            self.board = board
+        self.moves = array('I')
+        self.position = 0
+        # checkpoints[k] is the board after k * checkpoint_every moves
+        self.checkpoints = [self._snapshot()]
+
+    def __len__(self):
+        return len(self.moves)
+
+    def set_value(self, pos: int, val: int):
+        """Set the value at pos and record the move."""
+        self.apply(pos, val)
+
+    def remove_value(self, pos: int):
+        self.apply(pos, 0)
+
+    def set_candidates(self, pos: int, bits: int):
+        """Replace the candidates of pos with the mask bits and record the
+        move."""
+        self.apply(pos, candidates=bits)
+
+    def apply(self, pos: int, val: int = None, candidates: int = None):
+        """Change the value and/or the candidates of pos and record the
+        change as one move. Returns False, recording nothing, if neither
+        changes."""
+        board = self.board
+        old = int(board.array[pos])
+        new = old if val is None else val
+        # set_value validates, so nothing is recorded for a bad value. It
+        # may also update the candidates of pos when the board tracks them,
+        # so the delta is taken after.
+        board.set_value(pos, new)
+        bits = board.get_candidate_bits(pos)
+        if candidates is not None and board.tracking:
+            # as set_candidate_bits would, so the XOR undoes exactly
+            candidates &= board.markable_mask(pos)
+        delta = 0 if candidates is None else bits ^ candidates
+        if new == old and not delta:
+            return False
+        if delta:
+            board.set_candidate_bits(pos, bits ^ delta)
+        self._record(pack_move(pos, old, new, delta))
+        return True
+
+    def _record(self, move: int):
+        every = self.checkpoint_every
+        if self.position < len(self.moves):
+            # a new move after an undo; the redo tail is gone
+            del self.moves[self.position:]
+            del self.checkpoints[self.position // every + 1:]
+        self.moves.append(move)
+        self.position += 1
+        if self.position % every == 0:
+            self.checkpoints.append(self._snapshot())
+        if len(self.moves) > self.max_moves:
+            del self.moves[:every]
+            del self.checkpoints[0]
+            self.position -= every
+
+    def can_undo(self) -> bool:
+        return self.position > 0
+
+    def can_redo(self) -> bool:
+        return self.position < len(self.moves)
+
+    def undo(self):
+        """Take back the last move. Returns the cell it changed, or None if
+        there is nothing to undo."""
+        if not self.position:
+            return None
+        self.position -= 1
+        cell, old, new, delta = unpack_move(self.moves[self.position])
+        self._write(cell, old, delta)
+        return cell
+
+    def redo(self):
+        """Make the last undone move again. Returns the cell it changed, or
+        None if there is nothing to redo."""
+        if self.position == len(self.moves):
+            return None
+        cell, old, new, delta = unpack_move(self.moves[self.position])
+        self.position += 1
+        self._write(cell, new, delta)
+        return cell
+
+    def seek(self, position: int) -> set:
+        """Put the board in the state it was in after position moves.
+        Returns the set of cells that were written."""
+        if position < 0 or position > len(self.moves):
+            raise IndexError(f"{position} is invalid.")
+        changed = set()
+        every = self.checkpoint_every
+        if abs(position - self.position) > every:
+            changed |= self._restore(self.checkpoints[position // every])
+            self.position = position // every * every
+        while self.position > position:
+            changed.add(self.undo())
+        while self.position < position:
+            changed.add(self.redo())
+        return changed
+
+    def _write(self, cell: int, val: int, delta: int):
+        board = self.board
+        board.set_value(cell, val)
+        if delta:
+            board.set_candidate_bits(cell, board.get_candidate_bits(cell) ^ delta)
+
+    def _snapshot(self) -> bytes:
+        """Return the values of the board followed by its candidate masks
+        and the candidates struck out by hand, which decide what removing a
+        value gives back."""
+        board = self.board
+        values = bytes(int(v) for v in board.array)
+        candidates = array('H', (board.get_candidate_bits(i) for i in range(81)))
+        return values + candidates.tobytes() + board.struck.tobytes()
+
+    def _restore(self, snapshot: bytes) -> set:
+        board = self.board
+        candidates = array('H')
+        candidates.frombytes(snapshot[81:243])
+        changed = set()
+        for i in range(81):
+            if int(board.array[i]) != snapshot[i]:
+                board.set_value(i, snapshot[i])
+                changed.add(i)
+        # values first, since setting one can change the candidates of others
+        for i in range(81):
+            if board.get_candidate_bits(i) != candidates[i]:
+                board.set_candidate_bits(i, candidates[i])
+                changed.add(i)
+        # last, since set_candidate_bits rewrites the strikes of its square
+        board.struck = array('H')
+        board.struck.frombytes(snapshot[243:])
+        return changed
@@ -0,0 +1,166 @@
+"""
+A load-test client for server.py.
+
+    python loadtest.py --port 8765 --clients 50 --requests 200
+    python loadtest.py --spawn --clients 50 --requests 200
+
+Every client opens its own connection and plays like a person would:
+it asks for a puzzle, then alternates hints and checks, filling in each
+hint, until the puzzle is solved or its requests run out. --pipeline sends
+that many requests before reading the answers, to measure throughput
+rather than round trips; a pipelined batch is built from the grid as it
+was when the batch was sent. --spawn starts a server in the same process,
+waits for its stock to fill, and stops it afterwards, so the whole test
+runs offline with one command.
+
+Reports the requests per second over the run and the round-trip latency
+percentiles per op, as a table or, with --json, as JSON.
+"""
+import argparse
+import asyncio
+import json
+import sys
+import time
+from server import PuzzleServer, DIFFICULTIES
+
+
+async def run_client(reader, writer, requests: int, pipeline: int,
+                     difficulty: str, latencies: dict, errors: list):
+    """Make requests requests over one connection."""
+    puzzle = grid = None
+    made = 0
+    while made < requests:
+        if puzzle is None:
+            batch = [{"op": "puzzle", "difficulty": difficulty}]
+        else:
+            # every request in a batch is built from the same grid
+            batch = [
+                {"op": ("hint", "check")[(made + k) % 2],
+                 "puzzle": puzzle, "grid": grid}
+                for k in range(pipeline)
+            ]
+        batch = batch[:requests - made]
+        start = time.perf_counter()
+        writer.write(b"".join(json.dumps(r).encode() + b"\n" for r in batch))
+        await writer.drain()
+        for request in batch:
+            response = json.loads(await reader.readline())
+            latencies.setdefault(request["op"], []).append(
+                time.perf_counter() - start
+            )
+            made += 1
+            if not response["ok"]:
+                errors.append(response["error"])
+            elif request["op"] == "puzzle":
+                puzzle = grid = response["puzzle"]
+            elif request["op"] == "hint" and response["cell"] is not None:
+                cell = response["cell"]
+                grid = grid[:cell] + str(response["value"]) + grid[cell + 1:]
+            elif request["op"] == "check" and response["solved"]:
+                puzzle = None
+    writer.close()
+
+
+async def load_test(connect, clients: int, requests: int, pipeline: int = 1,
+                    difficulty: str = "medium") -> dict:
+    """Run clients concurrent clients of requests requests each, opening
+    connections with connect(). Returns the report."""
+    latencies = {}
+    errors = []
+    streams = [await connect() for _ in range(clients)]
+    start = time.perf_counter()
+    await asyncio.gather(*(
+        run_client(reader, writer, requests, pipeline, difficulty,
+                   latencies, errors)
+        for reader, writer in streams
+    ))
+    elapsed = time.perf_counter() - start
+    total = sum(len(v) for v in latencies.values())
+    ops = {}
+    for op, times in latencies.items():
+        times.sort()
+        ops[op] = {
+            "count": len(times),
+            "p50_ms": times[len(times) // 2] * 1e3,
+            "p90_ms": times[int(len(times) * 0.90)] * 1e3,
+            "p99_ms": times[int(len(times) * 0.99)] * 1e3,
+        }
+    return {
+        "clients": clients,
+        "pipeline": pipeline,
+        "requests": total,
+        "errors": len(errors),
+        "error_kinds": sorted(set(errors)),
+        "seconds": elapsed,
+        "per_second": total / elapsed,
+        "ops": ops,
+    }
+
+
+def print_report(report: dict):
+    print(f"{report['requests']} requests from {report['clients']} clients "
+          f"in {report['seconds']:.2f} s: {report['per_second']:.0f} per second, "
+          f"{report['errors']} errors")
+    for kind in report["error_kinds"]:
+        print(f"    error: {kind}")
+    print(f"{'op':<10}{'count':>10}{'p50 ms':>10}{'p90 ms':>10}{'p99 ms':>10}")
+    for op, row in sorted(report["ops"].items()):
+        print(f"{op:<10}{row['count']:>10}{row['p50_ms']:>10.2f}"
+              f"{row['p90_ms']:>10.2f}{row['p99_ms']:>10.2f}")
+
+
+async def run(args) -> dict:
+    server = None
+    if args.spawn:
+        server = PuzzleServer(stock=args.stock, workers=args.workers, seed=args.seed)
+        await server.start(args.host, args.port, args.unix)
+        await server.warm()
+    if args.unix:
+        def connect():
+            return asyncio.open_unix_connection(args.unix)
+    else:
+        def connect():
+            return asyncio.open_connection(args.host, args.port)
+    try:
+        return await load_test(connect, args.clients, args.requests,
+                               args.pipeline, args.difficulty)
+    finally:
+        if server is not None:
+            server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the puzzle server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None,
+                        help="connect to this Unix socket instead of TCP")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=200,
+                        help="requests per client")
+    parser.add_argument("--pipeline", type=int, default=1,
+                        help="requests sent before reading the answers")
+    parser.add_argument("--difficulty", choices=sorted(DIFFICULTIES),
+                        default="medium")
+    parser.add_argument("--spawn", action="store_true",
+                        help="run a server in this process for the test")
+    parser.add_argument("--stock", type=int, default=64,
+                        help="with --spawn, warm puzzles per clue count and difficulty")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="with --spawn, generator processes")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true",
+                        help="print the report as JSON")
+    args = parser.parse_args(argv)
+
+    report = asyncio.run(run(args))
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+    return 1 if report["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""
+A small pool of ready-made puzzles, refilled in the background.
+
+Generating a puzzle takes long enough to freeze a window, so PuzzlePool
+keeps a few finished puzzles queued. take() hands one over immediately and
+asks a background worker, a thread or a process, to make a replacement.
+Only compact bytes cross between the worker and the caller; the caller gets
+a finished board built from them.
+"""
+import concurrent.futures
+import queue
+import random
+import threading
+from bitboard import BitBoard
+from engine import SudokuBoard
+
+
+def make_puzzle(clues: int, unique: bool, seed: int):
+    """Generate one puzzle. Returns (puzzle, solution) as 81-byte bytes
+    objects. This runs in the worker, so it must stay at module level for
+    process pools to find it."""
+    board = BitBoard(seed=seed)
+    if unique:
+        board.generate_unique_puzzle(clues)
+    else:
+        board.generate_puzzle(clues)
+    return bytes(board.array), board.solution
+
+
+class PuzzlePool:
+    """Keeps up to size puzzles with the given number of clues ready.
+    unique selects generate_unique_puzzle over generate_puzzle.
+    processes runs the generator in a separate process instead of a thread,
+    so it does not compete with the caller for the GIL.
+    workers is the number of threads or processes used.
+    seed makes the sequence of puzzles reproducible.
+    board_class is the kind of board take() returns."""
+    def __init__(self, clues: int = 31, size: int = 3, unique: bool = True,
+                 processes: bool = False, workers: int = 1, seed=None,
+                 board_class=SudokuBoard) -> None:
+        self.clues = clues
+        self.unique = unique
+        self.board_class = board_class
+        self.random = random.Random(seed)
+        # finished futures, in the order they completed
+        self.ready = queue.Queue()
+        self._lock = threading.Lock()
+        self._closed = False
+        if processes:
+            self._executor = concurrent.futures.ProcessPoolExecutor(workers)
+        else:
+            self._executor = concurrent.futures.ThreadPoolExecutor(
+                workers, thread_name_prefix="puzzle-pool"
+            )
+        for _ in range(size):
+            self._refill()
+
+    def __len__(self):
+        """The number of puzzles ready to be taken."""
+        return self.ready.qsize()
+
+    def _refill(self):
+        with self._lock:
+            if self._closed:
+                return
+            future = self._executor.submit(
+                make_puzzle, self.clues, self.unique, self.random.getrandbits(64)
+            )
+        future.add_done_callback(self._finished)
+
+    def _finished(self, future):
+        if not future.cancelled():
+            self.ready.put(future)
+
+    def take_bytes(self, block: bool = True, timeout=None):
+        """Return the next (puzzle, solution) pair, or None if block is
+        False, or timeout passes, before one is ready. A replacement is
+        queued for every pair taken."""
+        try:
+            future = self.ready.get(block, timeout)
+        except queue.Empty:
+            return None
+        self._refill()
+        # re-raises anything the generator raised
+        return future.result()
+
+    def take(self, block: bool = True, timeout=None):
+        """Return the next puzzle as a finished board, or None as for
+        take_bytes."""
+        pair = self.take_bytes(block, timeout)
+        if pair is None:
+            return None
+        board = self.board_class()
+        board.load_puzzle(*pair)
+        return board
+
+    def close(self):
+        """Stop the workers, dropping any puzzles still being made."""
+        with self._lock:
+            self._closed = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
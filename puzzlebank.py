@@ -0,0 +1,175 @@
+"""
+A compact binary file format for storing large numbers of puzzles.
+
+The file starts with a 16-byte header:
+    magic       4 bytes, b"SDKB"
+    version     2 bytes
+    record size 2 bytes
+    count       8 bytes, the number of records that follow
+and is followed by count fixed-size records of 112 bytes each:
+    puzzle      41 bytes, the 81 values of the puzzle packed 4 bits each
+    clue mask   11 bytes, bit i is set if index i is a clue
+    solution    41 bytes, packed like the puzzle
+    difficulty  2 bytes, 0 if the puzzle has not been graded
+    seed        8 bytes, the seed the puzzle was generated from
+    transform   8 bytes, the index of the symmetry.Transform that turned the
+                generated puzzle into this one, 0 if it was stored as is
+    (1 byte of padding)
+All integers are little-endian. Because every record is the same size, the
+k-th record always starts at HEADER.size + k * RECORD.size, so the record
+numbers themselves are the index and any puzzle can be read in O(1).
+A puzzle can always be made again from its seed and transform alone.
+"""
+import mmap
+import os
+import struct
+from collections import namedtuple
+
+MAGIC = b"SDKB"
+VERSION = 2
+HEADER = struct.Struct("<4sHHQ")
+RECORD = struct.Struct("<41s11s41sHQQx")
+# The difficulty field, read on its own from offset 93 of a record.
+DIFFICULTY = struct.Struct("<H")
+DIFFICULTY_OFFSET = 93
+
+# Lookup tables for splitting a packed byte into its two values, and for
+# moving a value into the high half of a byte.
+_HIGH = bytes(b >> 4 for b in range(256))
+_LOW = bytes(b & 0xF for b in range(256))
+_SHIFT = bytes((b << 4) & 0xFF for b in range(256))
+
+Record = namedtuple("Record", "puzzle clues solution difficulty seed transform")
+Record.__doc__ = """One puzzle read from a bank. puzzle and solution are
+81-byte bytes objects, and clues is a list of the clue indices."""
+
+
+def pack_values(values) -> bytes:
+    """Pack 81 values from 0 to 15 into 41 bytes, two values per byte."""
+    padded = bytes(values) + b"\0"
+    high = padded[0::2].translate(_SHIFT)
+    low = padded[1::2]
+    # the halves never overlap, so OR-ing the two big integers packs them
+    packed = int.from_bytes(high, "big") | int.from_bytes(low, "big")
+    return packed.to_bytes(41, "big")
+
+
+def unpack_values(data: bytes) -> bytes:
+    """Undo pack_values."""
+    values = bytearray(82)
+    values[0::2] = data.translate(_HIGH)
+    values[1::2] = data.translate(_LOW)
+    return bytes(values[:81])
+
+
+def pack_clue_mask(clues) -> bytes:
+    mask = 0
+    for i in clues:
+        mask |= 1 << i
+    return mask.to_bytes(11, "little")
+
+
+def unpack_clue_mask(data: bytes) -> list:
+    mask = int.from_bytes(data, "little")
+    return [i for i in range(81) if mask >> i & 1]
+
+
+def append_puzzles(path, puzzles) -> int:
+    """Append puzzles to the bank at path, creating it if needed. Each
+    puzzle is a (puzzle, solution, difficulty, seed) tuple, where puzzle and
+    solution are sequences of 81 values and every non-zero value of the
+    puzzle is a clue, optionally followed by a transform index. puzzles can
+    be any iterable, such as generate.generate_batch. Returns the number of
+    records appended."""
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        with open(path, "wb") as f:
+            f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, 0))
+    with open(path, "r+b") as f:
+        count = _read_header(f.read(HEADER.size))
+        f.seek(HEADER.size + count * RECORD.size)
+        appended = 0
+        for puzzle, solution, difficulty, seed, *transform in puzzles:
+            puzzle = bytes(int(v) for v in puzzle)
+            clues = [i for i in range(81) if puzzle[i]]
+            f.write(RECORD.pack(
+                pack_values(puzzle),
+                pack_clue_mask(clues),
+                pack_values(int(v) for v in solution),
+                difficulty,
+                seed,
+                transform[0] if transform else 0,
+            ))
+            appended += 1
+        # the count is only updated once every record has been written
+        f.seek(0)
+        f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, count + appended))
+    return appended
+
+
+def _read_header(data: bytes) -> int:
+    """Check the header and return the number of records."""
+    magic, version, record_size, count = HEADER.unpack(data)
+    if magic != MAGIC:
+        raise ValueError("Not a puzzle bank file")
+    if version != VERSION or record_size != RECORD.size:
+        raise ValueError(f"Unsupported puzzle bank version {version}")
+    return count
+
+
+class PuzzleBank:
+    """Read-only, memory-mapped access to a puzzle bank file. Only the
+    records that are actually read are loaded from disk."""
+    def __init__(self, path) -> None:
+        self._file = open(path, "rb")
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.count = _read_header(self._map[:HEADER.size])
+        if len(self._map) < HEADER.size + self.count * RECORD.size:
+            raise ValueError("Puzzle bank file is truncated")
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, k: int) -> Record:
+        if k < 0:
+            k += self.count
+        if k < 0 or k >= self.count:
+            raise IndexError(f"{k} is invalid.")
+        puzzle, clue_mask, solution, difficulty, seed, transform = (
+            RECORD.unpack_from(self._map, HEADER.size + k * RECORD.size)
+        )
+        return Record(
+            unpack_values(puzzle),
+            unpack_clue_mask(clue_mask),
+            unpack_values(solution),
+            difficulty,
+            seed,
+            transform,
+        )
+
+    def by_difficulty(self) -> list:
+        """Return every record number, sorted from easiest to hardest. Only
+        the difficulty field of each record is read."""
+        difficulty = [
+            DIFFICULTY.unpack_from(
+                self._map, HEADER.size + k * RECORD.size + DIFFICULTY_OFFSET
+            )[0]
+            for k in range(self.count)
+        ]
+        return sorted(range(self.count), key=difficulty.__getitem__)
+
+    def load(self, k: int, board) -> Record:
+        """Load the k-th puzzle into board, setting its array, clues, and
+        solution. Returns the record."""
+        record = self[k]
+        board.load_puzzle(record.puzzle, record.solution)
+        return record
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
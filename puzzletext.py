@@ -0,0 +1,210 @@
+"""
+Streaming import and export of the one-puzzle-per-line text format most
+public puzzle collections use:
+
+    003020600900305001001806400008102900700000008006708200002609500800203009005010300
+    ..3.2.6..9..3.5..1..18.64....81.29..7.......8..67.82....26.95..8..2.3..9..5.1.3.. 483921657967345821251876493548132976729564138136798245372689514814253769695417382
+
+Each line starts with the 81 cells of the puzzle, row by row, with 0 or '.'
+for the blanks. It may be followed by a separator (space, tab, comma,
+semicolon, colon, or '|') and a solution, 81 more digits with no blanks;
+any other trailing columns, such as ratings, are ignored. Blank lines and
+lines starting with '#' are skipped, and so is a first line that does not
+start with a digit or '.', such as the "quizzes,solutions" header of the
+CSV corpora. Line endings may be \\n or \\r\\n.
+
+Files are read a chunk at a time and split into lines in memory, so a file
+of millions of puzzles is read in constant memory, and each line costs a
+slice, a bytes.translate, and a byte search. Puzzles come out as 81-byte
+bytes objects, the same form generate.py and puzzlebank.py use:
+
+    read_puzzles(path)   yields (puzzle, solution or None) pairs
+    read_boards(path)    yields one board, loaded with each puzzle in turn
+    read_batches(path)   yields (N, 81) NumPy arrays for batch.py
+    write_puzzles(path, puzzles)
+
+Paths may be '-' for stdin or stdout, or an open binary file.
+"""
+import sys
+from bitboard import BitBoard
+
+# Maps '0' - '9' and '.' to the values 0 - 9, and every other byte to BAD.
+BAD = 0xFF
+FROM_TEXT = bytes(
+    c - 48 if 48 <= c <= 57 else 0 if c == 46 else BAD for c in range(256)
+)
+# Maps the values 0 - 9 to the characters '0' - '9'.
+TO_TEXT = bytes.maketrans(bytes(range(10)), b"0123456789")
+
+SEPARATORS = b" \t,;:|"
+CHUNK_SIZE = 1 << 20
+
+
+class _Opened:
+    """Open path for binary reading or writing, unless it is already an
+    open file or '-', which are used as they are and left open."""
+    def __init__(self, path, mode: str) -> None:
+        self.path = path
+        self.mode = mode
+        self.file = None
+
+    def __enter__(self):
+        if hasattr(self.path, "read") or hasattr(self.path, "write"):
+            return self.path
+        if self.path == "-":
+            stream = sys.stdin if "r" in self.mode else sys.stdout
+            return stream.buffer
+        self.file = open(self.path, self.mode)
+        return self.file
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            self.file.close()
+
+
+def _lines(f, chunk_size: int):
+    """Yield the lines of f, a binary file, without their newlines."""
+    tail = b""
+    while True:
+        chunk = f.read(chunk_size)
+        if not chunk:
+            break
+        lines = (tail + chunk).split(b"\n")
+        tail = lines.pop()
+        yield from lines
+    if tail:
+        yield tail
+
+
+def parse_line(line: bytes):
+    """Return (puzzle, solution) for one line, where solution is None if the
+    line has none, or None for a blank or comment line. Raises ValueError
+    if the line does not start with a puzzle."""
+    line = line.rstrip()
+    if not line or line[0] == 35:  # '#'
+        return None
+    puzzle = line[:81].translate(FROM_TEXT)
+    if len(puzzle) < 81 or BAD in puzzle or (
+        len(line) > 81 and line[81] not in SEPARATORS
+    ):
+        raise ValueError("Not an 81-character puzzle")
+    solution = None
+    if len(line) >= 163:
+        rest = line[82:].lstrip(SEPARATORS)
+        candidate = rest[:81].translate(FROM_TEXT)
+        if (len(candidate) == 81 and BAD not in candidate and 0 not in candidate
+                and (len(rest) == 81 or rest[81] in SEPARATORS)):
+            solution = candidate
+    return puzzle, solution
+
+
+def read_puzzles(source, chunk_size: int = CHUNK_SIZE,
+                 on_error: str = "raise"):
+    """Yield a (puzzle, solution) pair for every puzzle in source, a path or
+    a binary file. solution is None for lines without one. A first line
+    that does not start with a digit or '.' is a header and is skipped;
+    any other line that is not a puzzle raises ValueError, naming the
+    line, or is skipped if on_error is "skip"."""
+    if on_error not in ("raise", "skip"):
+        raise ValueError('on_error is "raise" or "skip"')
+    with _Opened(source, "rb") as f:
+        name = getattr(f, "name", "input")
+        header = True
+        for number, line in enumerate(_lines(f, chunk_size), 1):
+            try:
+                parsed = parse_line(line)
+            except ValueError as e:
+                # a damaged first puzzle is an error like any other
+                if (header and FROM_TEXT[line[0]] == BAD) or on_error == "skip":
+                    header = False
+                    continue
+                raise ValueError(f"{name}, line {number}: {e}") from None
+            if parsed is not None:
+                header = False
+                yield parsed
+
+
+def read_boards(source, board=None, chunk_size: int = CHUNK_SIZE,
+                on_error: str = "raise"):
+    """Yield board, a new BitBoard if it is not given, once for every puzzle
+    in source, with that puzzle loaded and its clues and solution set. The
+    same board is yielded every time, so keep what is needed from it
+    before asking for the next. on_error is as for read_puzzles."""
+    if board is None:
+        board = BitBoard()
+    for puzzle, solution in read_puzzles(source, chunk_size, on_error):
+        board.load_puzzle(puzzle, solution)
+        yield board
+
+
+def read_batches(source, rows: int = 4096, chunk_size: int = CHUNK_SIZE,
+                 on_error: str = "raise"):
+    """Yield (puzzles, solutions) as (N, 81) uint8 NumPy arrays of up to
+    rows puzzles at a time, in the form batch.py takes. A puzzle without a
+    solution has a row of zeros in solutions. on_error is as for
+    read_puzzles."""
+    import numpy as np
+    blank = bytes(81)
+    puzzles = []
+    solutions = []
+    def batch():
+        return (
+            np.frombuffer(b"".join(puzzles), dtype=np.uint8).reshape(-1, 81),
+            np.frombuffer(b"".join(solutions), dtype=np.uint8).reshape(-1, 81),
+        )
+    for puzzle, solution in read_puzzles(source, chunk_size, on_error):
+        puzzles.append(puzzle)
+        solutions.append(solution or blank)
+        if len(puzzles) == rows:
+            yield batch()
+            puzzles.clear()
+            solutions.clear()
+    if puzzles:
+        yield batch()
+
+
+def format_line(puzzle, solution=None, blank: bytes = b"0") -> bytes:
+    """Return the line for puzzle and, if it is given, its solution, each a
+    sequence of 81 values, including the newline."""
+    return _format(puzzle, solution, blank + TO_TEXT[1:])
+
+
+def _format(puzzle, solution, table: bytes) -> bytes:
+    line = _as_bytes(puzzle).translate(table)
+    if solution is not None:
+        line += b" " + _as_bytes(solution).translate(TO_TEXT)
+    return line + b"\n"
+
+
+def _as_bytes(values) -> bytes:
+    if isinstance(values, bytes):
+        return values
+    return bytes(int(v) for v in values)
+
+
+def write_puzzles(dest, puzzles, blank: bytes = b"0",
+                  buffer_lines: int = 4096) -> int:
+    """Write puzzles to dest, a path or a binary file, one per line. Each
+    puzzle is a sequence of 81 values, a board, or a (puzzle, solution)
+    pair whose solution may be None. blank is written for the blanks.
+    Lines are written buffer_lines at a time. Returns the number of puzzles
+    written."""
+    table = blank + TO_TEXT[1:]
+    written = 0
+    lines = []
+    with _Opened(dest, "wb") as f:
+        for item in puzzles:
+            if hasattr(item, "array"):
+                lines.append(_format(item.array, None, table))
+            elif len(item) == 2:
+                lines.append(_format(item[0], item[1], table))
+            else:
+                lines.append(_format(item, None, table))
+            if len(lines) == buffer_lines:
+                f.write(b"".join(lines))
+                written += len(lines)
+                lines.clear()
+        f.write(b"".join(lines))
+        written += len(lines)
+        f.flush()
+    return written
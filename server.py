@@ -0,0 +1,455 @@
+"""
+An asyncio daemon that serves puzzles to many clients from one process:
+
+    python server.py --port 8765
+    python server.py --unix /tmp/sudoku.sock
+
+Clients talk JSON lines: one request object per line, answered by one
+response object per line, in order. Every request has an "op" and may carry
+an "id", which is echoed back. Grids are 81-character strings of the digits
+0 - 9, with 0 (or '.') for the blanks.
+
+    {"op": "puzzle", "clues": 30}
+    {"op": "puzzle", "difficulty": "hard"}
+        -> {"ok": true, "puzzle": "...", "clues": 30, "difficulty": "medium",
+            "score": 57}
+    {"op": "check", "puzzle": "...", "grid": "..."}
+        -> {"ok": true, "solved": false, "conflicts": [...], "wrong": [...]}
+    {"op": "hint", "puzzle": "...", "grid": "...", "cell": 40}
+        -> {"ok": true, "cell": 40, "value": 7}
+    {"op": "stats"}
+        -> request counts and latency percentiles per op, and pool levels
+
+A failed request gets {"ok": false, "error": "..."}. Every puzzle has
+exactly one solution and is graded: "difficulty" names the hardest
+technique it needs (see DIFFICULTIES), and "score" is the grader's score,
+for clients that want finer control.
+
+Puzzles come from warm stocks, one per clue count and one per named
+difficulty, so a request never waits on the generator while its stock
+lasts. A process pool refills each stock with make_puzzles in the
+background whenever it drops below half full. Clue counts do not say much
+about how hard a puzzle is, so the difficulty stocks are filled with
+minimal puzzles, which spread the widest over the grader's levels, and
+each one goes to the stock of its level. The server remembers the
+solution of the last --remember puzzles it handed out; check and hint
+answer from that, so no request ever runs a solver. "wrong" lists the
+entries that differ from the solution, and "conflicts" the ones that
+clash with another value.
+
+Backpressure comes from three places: a connection's requests are handled
+one at a time and its next line is not read until the last response has
+drained, connections beyond --max-clients are turned away, and a puzzle
+request that finds its stock empty waits at most --max-wait seconds before
+getting a "busy" error.
+"""
+import argparse
+import asyncio
+from collections import OrderedDict, deque
+import concurrent.futures
+import json
+import os
+import random
+import time
+from array import array
+from bitboard import BitBoard
+from generate import SEED_BITS, puzzle_seed
+from grader import Grader, TECHNIQUES
+from puzzletext import BAD, FROM_TEXT, TO_TEXT
+
+# Maps the named difficulties to the highest grader level each takes: easy
+# needs only singles, medium anything up to pointing/claiming, and hard the
+# fish, coloring, or trial and error. The levels index TECHNIQUES.
+DIFFICULTIES = {"easy": 1, "medium": 6, "hard": len(TECHNIQUES)}
+
+# The clue counts kept in stock unless others are asked for.
+CLUES = (26, 30, 36)
+
+# Requests longer than this are refused and the connection closed.
+MAX_LINE = 1024
+
+
+class RequestError(Exception):
+    """A request that cannot be answered; the message goes to the client."""
+
+
+def parse_grid(text) -> bytes:
+    """Return the 81 values of an 81-character grid string."""
+    if not isinstance(text, str) or len(text) != 81:
+        raise RequestError("A grid is a string of 81 digits")
+    values = text.encode("ascii", "replace").translate(FROM_TEXT)
+    if BAD in values:
+        raise RequestError("A grid is a string of 81 digits")
+    return values
+
+
+def format_grid(values) -> str:
+    return bytes(values).translate(TO_TEXT).decode("ascii")
+
+
+def difficulty_of(level: int) -> str:
+    """Return the named difficulty of a grader level."""
+    for name, highest in DIFFICULTIES.items():
+        if level <= highest:
+            return name
+    return name
+
+
+def make_puzzles(first: int, size: int, clues, seed: int):
+    """Generate unique puzzles number first to first + size - 1, in a worker
+    process. clues is the clue count, or None for minimal puzzles. Returns a
+    list of (puzzle, solution, difficulty, score) tuples."""
+    board = BitBoard()
+    puzzles = []
+    for number in range(first, first + size):
+        board.random.seed(puzzle_seed(seed, number))
+        if clues is None:
+            # one pass, removing clues until none more can go
+            board.generate_unique_puzzle(17, max_attempts=1)
+        else:
+            board.generate_unique_puzzle(clues)
+        grade = Grader(board.array).grade()
+        puzzles.append((bytes(board.array), board.solution,
+                        difficulty_of(grade.level), grade.score))
+    return puzzles
+
+
+class LatencyStats:
+    """Counts the requests of one op and keeps the latencies of the last
+    window of them, in seconds, for percentiles."""
+    def __init__(self, window: int = 4096) -> None:
+        self.window = window
+        self.count = 0
+        self.errors = 0
+        self.latencies = array('d', bytes(8 * window))
+
+    def record(self, seconds: float, ok: bool = True):
+        self.latencies[self.count % self.window] = seconds
+        self.count += 1
+        if not ok:
+            self.errors += 1
+
+    def as_dict(self) -> dict:
+        recent = sorted(self.latencies[:min(self.count, self.window)])
+        def percentile(p):
+            if not recent:
+                return None
+            return round(recent[min(len(recent) - 1, int(p * len(recent)))] * 1e6, 1)
+        return {
+            "count": self.count,
+            "errors": self.errors,
+            "p50_us": percentile(0.50),
+            "p90_us": percentile(0.90),
+            "p99_us": percentile(0.99),
+        }
+
+
+class PuzzleStock:
+    """The warm puzzles of one clue count, or of one named difficulty if
+    clues is None, as (puzzle, solution, difficulty, score) tuples, and the
+    event that wakes whoever waits on them."""
+    def __init__(self, clues, size: int) -> None:
+        self.clues = clues
+        self.size = size
+        self.puzzles = deque()
+        self.refilling = False
+        self.ready = asyncio.Event()
+
+    def __len__(self):
+        return len(self.puzzles)
+
+
+class PuzzleServer:
+    """Serves puzzles with the given clue counts and the named
+    difficulties over JSON lines.
+    stock is the number of warm puzzles kept per clue count and per
+    difficulty, made chunk at a time by workers processes.
+    remember bounds the solutions kept for check and hint.
+    max_clients bounds the open connections and max_wait the seconds a
+    puzzle request waits for an empty stock.
+    seed makes the sequence of puzzles reproducible."""
+    def __init__(self, clues=CLUES, stock: int = 256,
+                 workers: int = None, chunk: int = 32, remember: int = 65536,
+                 max_clients: int = 1024, max_wait: float = 1.0,
+                 seed: int = None) -> None:
+        # keyed by clue count, and by name for the difficulties
+        self.stocks = {n: PuzzleStock(n, stock) for n in clues}
+        for name in DIFFICULTIES:
+            self.stocks[name] = PuzzleStock(None, stock)
+        self.workers = workers or max(1, (os.cpu_count() or 2) - 1)
+        self.chunk = chunk
+        self.remember = remember
+        self.max_clients = max_clients
+        self.max_wait = max_wait
+        if seed is None:
+            seed = random.getrandbits(SEED_BITS)
+        elif not 0 <= seed < 1 << SEED_BITS:
+            raise ValueError(f"seed is from 0 to {(1 << SEED_BITS) - 1}")
+        self.seed = seed
+        self.clients = 0
+        self.refused = 0
+        self.stats = {}
+        # puzzle bytes -> solution, least recently served first
+        self.issued = OrderedDict()
+        # puzzle numbers handed to make_puzzles so far, for its seeds
+        self.generated = 0
+        self._board = BitBoard()
+        self._executor = None
+        self._server = None
+        self._tasks = set()
+        self.handlers = {
+            "puzzle": self.get_puzzle,
+            "check": self.check,
+            "hint": self.hint,
+            "stats": self.get_stats,
+        }
+
+    async def start(self, host: str = "127.0.0.1", port: int = 8765,
+                    path: str = None):
+        """Start the workers and listen on a TCP port, or on the Unix
+        socket at path if it is given. Returns the asyncio server."""
+        self._executor = concurrent.futures.ProcessPoolExecutor(self.workers)
+        for stock in self.stocks.values():
+            self._refill(stock)
+        if path:
+            self._server = await asyncio.start_unix_server(
+                self.handle_client, path, limit=MAX_LINE
+            )
+        else:
+            self._server = await asyncio.start_server(
+                self.handle_client, host, port, limit=MAX_LINE
+            )
+        return self._server
+
+    async def warm(self):
+        """Wait until every stock is full."""
+        for stock in self.stocks.values():
+            while len(stock) < stock.size:
+                stock.ready.clear()
+                await stock.ready.wait()
+
+    def close(self):
+        if self._server is not None:
+            self._server.close()
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # Refilling
+
+    def _refill(self, stock: PuzzleStock):
+        if not stock.refilling and len(stock) < stock.size:
+            stock.refilling = True
+            task = asyncio.get_running_loop().create_task(self._fill(stock))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+    async def _fill(self, stock: PuzzleStock):
+        """Generate chunks for stock until it is full again. The difficulty
+        stocks share their chunks: each puzzle goes to the stock of its
+        difficulty, or is dropped if that one is full."""
+        loop = asyncio.get_running_loop()
+        try:
+            while len(stock) < stock.size:
+                first = self.generated
+                self.generated += self.chunk
+                chunk = await loop.run_in_executor(
+                    self._executor, make_puzzles,
+                    first, self.chunk, stock.clues, self.seed
+                )
+                for item in chunk:
+                    target = stock if stock.clues is not None else self.stocks[item[2]]
+                    if len(target) < target.size:
+                        target.puzzles.append(item)
+                        target.ready.set()
+        finally:
+            stock.refilling = False
+
+    # Connections
+
+    async def handle_client(self, reader, writer):
+        if self.clients >= self.max_clients:
+            self.refused += 1
+            writer.write(b'{"ok": false, "error": "busy"}\n')
+            writer.close()
+            return
+        self.clients += 1
+        try:
+            while True:
+                try:
+                    line = await reader.readline()
+                except (ValueError, asyncio.LimitOverrunError):
+                    writer.write(b'{"ok": false, "error": "request too long"}\n')
+                    break
+                if not line:
+                    break
+                writer.write(await self.respond(line))
+                # the next request waits until a slow reader catches up
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            self.clients -= 1
+            writer.close()
+
+    async def respond(self, line: bytes) -> bytes:
+        """Answer one request line with one response line."""
+        start = time.perf_counter()
+        op = None
+        request_id = None
+        try:
+            request = json.loads(line)
+            if not isinstance(request, dict):
+                raise RequestError("A request is a JSON object")
+            request_id = request.get("id")
+            name = request.get("op")
+            # a list or object op cannot even be looked up
+            handler = self.handlers.get(name) if isinstance(name, str) else None
+            if handler is None:
+                raise RequestError(f"Unknown op {name!r}")
+            op = name
+            response = await handler(request)
+            response["ok"] = True
+        except (RequestError, TypeError, ValueError) as e:
+            response = {"ok": False, "error": str(e)}
+        if request_id is not None:
+            response["id"] = request_id
+        # unknown ops are counted together under None, so clients cannot
+        # grow the dict
+        stats = self.stats.get(op)
+        if stats is None:
+            stats = self.stats[op] = LatencyStats()
+        stats.record(time.perf_counter() - start, response["ok"])
+        return json.dumps(response).encode() + b"\n"
+
+    # Ops
+
+    async def get_puzzle(self, request) -> dict:
+        if "difficulty" in request:
+            name = request["difficulty"]
+            if not isinstance(name, str) or name not in DIFFICULTIES:
+                raise RequestError(
+                    f"difficulty is one of {', '.join(DIFFICULTIES)}"
+                )
+            stock = self.stocks[name]
+        else:
+            clues = request.get("clues")
+            # bool is an int too, and True is not a clue count
+            stock = self.stocks.get(clues) if type(clues) is int else None
+            if stock is None or stock.clues is None:
+                counts = sorted(s.clues for s in self.stocks.values()
+                                if s.clues is not None)
+                raise RequestError(
+                    f"clues is one of {', '.join(map(str, counts))}"
+                )
+        if not stock.puzzles:
+            self._refill(stock)
+            stock.ready.clear()
+            try:
+                await asyncio.wait_for(stock.ready.wait(), self.max_wait)
+            except asyncio.TimeoutError:
+                pass
+            if not stock.puzzles:
+                raise RequestError("busy")
+        puzzle, solution, difficulty, score = stock.puzzles.popleft()
+        if len(stock) < stock.size // 2:
+            self._refill(stock)
+        self.issued[puzzle] = solution
+        if len(self.issued) > self.remember:
+            self.issued.popitem(last=False)
+        return {"puzzle": format_grid(puzzle), "clues": 81 - puzzle.count(0),
+                "difficulty": difficulty, "score": score}
+
+    def _load(self, request):
+        """Return the puzzle and grid of request, with the solution of the
+        puzzle, checking that the grid keeps the puzzle's clues."""
+        puzzle = parse_grid(request.get("puzzle"))
+        grid = parse_grid(request.get("grid", request.get("puzzle")))
+        solution = self.issued.get(puzzle)
+        if solution is None:
+            raise RequestError("Unknown puzzle")
+        self.issued.move_to_end(puzzle)
+        for i in range(81):
+            if puzzle[i] and grid[i] != puzzle[i]:
+                raise RequestError(f"The grid changes the clue at {i}")
+        return puzzle, grid, solution
+
+    async def check(self, request) -> dict:
+        puzzle, grid, solution = self._load(request)
+        # parse_grid has checked the values, so the board can skip that
+        board = self._board
+        board._load_grid(grid)
+        return {
+            "solved": board.is_solved,
+            "conflicts": sorted(board.conflicting),
+            "wrong": [i for i in range(81) if grid[i] and grid[i] != solution[i]],
+        }
+
+    async def hint(self, request) -> dict:
+        """Reveal the requested cell, or else the first wrong entry, or
+        else the first blank. cell is None once the grid is solved."""
+        puzzle, grid, solution = self._load(request)
+        cell = request.get("cell")
+        if cell is None:
+            wrong = [i for i in range(81) if grid[i] != solution[i]]
+            wrong.sort(key=lambda i: not grid[i])
+            if not wrong:
+                return {"cell": None, "value": None}
+            cell = wrong[0]
+        elif type(cell) is not int or not 0 <= cell < 81:
+            raise RequestError("cell is from 0 to 80")
+        return {"cell": cell, "value": solution[cell]}
+
+    async def get_stats(self, request) -> dict:
+        return {
+            "ops": {op or "invalid": s.as_dict() for op, s in self.stats.items()},
+            "stock": {n: len(s) for n, s in self.stocks.items()},
+            "clients": self.clients,
+            "refused": self.refused,
+            "remembered": len(self.issued),
+        }
+
+
+async def serve(server: PuzzleServer, host, port, path):
+    listener = await server.start(host, port, path)
+    where = path or f"{host}:{port}"
+    print(f"Serving puzzles on {where}", flush=True)
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        server.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Serve sudoku puzzles over JSON lines.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix", default=None,
+                        help="listen on this Unix socket instead of TCP")
+    parser.add_argument("--clues", type=int, nargs="+",
+                        default=list(CLUES),
+                        help="the clue counts to keep puzzles for")
+    parser.add_argument("--stock", type=int, default=256,
+                        help="warm puzzles kept per clue count and difficulty")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="generator processes (default: one less than the cores)")
+    parser.add_argument("--remember", type=int, default=65536,
+                        help="puzzles whose solutions are kept for check and hint")
+    parser.add_argument("--max-clients", type=int, default=1024)
+    parser.add_argument("--max-wait", type=float, default=1.0,
+                        help="seconds a puzzle request waits on an empty stock")
+    parser.add_argument("--seed", type=int, default=None)
+    args = parser.parse_args(argv)
+
+    server = PuzzleServer(
+        args.clues, args.stock, args.workers, remember=args.remember,
+        max_clients=args.max_clients, max_wait=args.max_wait, seed=args.seed,
+    )
+    try:
+        asyncio.run(serve(server, args.host, args.port, args.unix))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
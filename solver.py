@@ -0,0 +1,247 @@
+"""
+An exact solver for sudoku puzzles.
+
+A puzzle is turned into an exact cover problem and solved with Knuth's
+Algorithm X. Each of the 729 possible placements (a digit in a cell) is a
+row that covers four of the 324 constraint columns:
+    1. the cell is filled
+    2. the row contains the digit
+    3. the column contains the digit
+    4. the house contains the digit
+A solution is a set of placements that covers every column exactly once.
+
+The links are kept in dicts of sets rather than a linked list; removing a
+row from a set and putting it back plays the same role as the dancing links
+in Knuth's version, and is much cheaper in Python.
+"""
+# UniquenessChecker works with bitmasks instead of the exact cover table.
+# Bit d of a mask stands for digit d.
+from engine import ALL_DIGITS, UNITS_OF, MASK_DIGITS
+
+
+def _placement_columns(pos: int, digit: int):
+    row, col = pos // 9, pos % 9
+    house = (row // 3) * 3 + col // 3
+    d = digit - 1
+    return (pos, 81 + row * 9 + d, 162 + col * 9 + d, 243 + house * 9 + d)
+
+
+# Placement pos * 9 + (digit - 1) covers the columns PLACEMENTS[placement].
+PLACEMENTS = tuple(
+    _placement_columns(pos, digit) for pos in range(81) for digit in range(1, 10)
+)
+
+# COLUMN_ROWS[c] holds every placement that covers column c.
+COLUMN_ROWS = tuple(
+    frozenset(p for p in range(729) if c in PLACEMENTS[p]) for c in range(324)
+)
+
+
+class SolverStats:
+    """Counters collected during a search.
+    nodes: the number of times a column was chosen and branched on.
+    backtracks: the number of dead ends, i.e. columns left with no rows.
+    solutions: the number of solutions found."""
+    def __init__(self) -> None:
+        self.nodes = 0
+        self.backtracks = 0
+        self.solutions = 0
+
+    def __repr__(self):
+        return (f"SolverStats(nodes={self.nodes}, "
+                f"backtracks={self.backtracks}, solutions={self.solutions})")
+
+
+class Solver:
+    """Solves the puzzle given by grid, a sequence of 81 values where 0 is
+    a blank. A SudokuBoard's array can be passed directly."""
+    def __init__(self, grid) -> None:
+        self.grid = [int(v) for v in grid]
+        if len(self.grid) != 81:
+            raise ValueError("A puzzle must have exactly 81 values")
+        self.stats = SolverStats()
+        self._limit = 0
+        self._first = None
+
+    def _cover_givens(self):
+        """Build the column table and select the placements of every given.
+        Returns None if two givens conflict with each other."""
+        columns = {c: set(COLUMN_ROWS[c]) for c in range(324)}
+        for pos, digit in enumerate(self.grid):
+            if digit:
+                if not 1 <= digit <= 9:
+                    raise ValueError(f"Value at index {pos} must be within [0, 9]")
+                placement = pos * 9 + digit - 1
+                if any(c not in columns for c in PLACEMENTS[placement]):
+                    return None
+                _select(columns, placement)
+        return columns
+
+    def _search(self, columns, chosen):
+        if not columns:
+            self.stats.solutions += 1
+            if self._first is None:
+                self._first = list(chosen)
+            return
+        # choose the column with the fewest rows, stopping early on a
+        # forced or dead column
+        rows = None
+        fewest = 10
+        for c_rows in columns.values():
+            n = len(c_rows)
+            if n < fewest:
+                rows, fewest = c_rows, n
+                if n <= 1:
+                    break
+        if not rows:
+            self.stats.backtracks += 1
+            return
+        self.stats.nodes += 1
+        for placement in list(rows):
+            chosen.append(placement)
+            removed = _select(columns, placement)
+            self._search(columns, chosen)
+            _deselect(columns, placement, removed)
+            chosen.pop()
+            if self.stats.solutions >= self._limit:
+                return
+
+    def _run(self, limit: int):
+        self.stats = SolverStats()
+        self._limit = limit
+        self._first = None
+        columns = self._cover_givens()
+        if columns is not None and limit > 0:
+            self._search(columns, [])
+        return self.stats.solutions
+
+    def solve(self):
+        """Return the first solution as a list of 81 ints, or None if the
+        puzzle has no solution."""
+        self._run(1)
+        if self._first is None:
+            return None
+        solution = list(self.grid)
+        for placement in self._first:
+            solution[placement // 9] = placement % 9 + 1
+        return solution
+
+    def count_solutions(self, limit: int = 2) -> int:
+        """Count the solutions of the puzzle, stopping once limit of them
+        have been found. The default answers whether the puzzle is unique."""
+        return self._run(limit)
+
+
+def _select(columns, placement):
+    """Cover every column of placement, removing the placements that clash
+    with it. Returns the removed columns so they can be restored."""
+    removed = []
+    for c in PLACEMENTS[placement]:
+        for other in columns[c]:
+            for k in PLACEMENTS[other]:
+                if k != c:
+                    columns[k].discard(other)
+        removed.append(columns.pop(c))
+    return removed
+
+
+def _deselect(columns, placement, removed):
+    """Undo _select, restoring the columns in the opposite order."""
+    for c in reversed(PLACEMENTS[placement]):
+        columns[c] = removed.pop()
+        for other in columns[c]:
+            for k in PLACEMENTS[other]:
+                if k != c:
+                    columns[k].add(other)
+
+
+def solve(board):
+    """Return the first solution of board as a list of 81 ints, or None."""
+    return Solver(board.array).solve()
+
+
+def count_solutions(board, limit: int = 2) -> int:
+    """Count the solutions of board, up to limit."""
+    return Solver(board.array).count_solutions(limit)
+
+
+
+
+class UniquenessChecker:
+    """Answers 'does this puzzle still have exactly one solution?' while
+    clues are removed from a solved grid one at a time.
+
+    The givens are kept as one occupancy mask per unit, so removing or
+    restoring a clue is a constant-time update and every check starts from
+    the current state instead of rebuilding the puzzle. Because the puzzle
+    is unique before a clue at pos is removed, any second solution must
+    put a different digit at pos; has_other_solution searches only for
+    that, and stops at the first one it finds."""
+    def __init__(self, solution) -> None:
+        self.solution = [int(v) for v in solution]
+        self.givens = [True] * 81
+        self.unit_masks = [0] * 27
+        for pos, digit in enumerate(self.solution):
+            for unit in UNITS_OF[pos]:
+                self.unit_masks[unit] |= 1 << digit
+        self.stats = SolverStats()
+
+    def remove(self, pos: int) -> None:
+        """Turn the clue at pos into a blank."""
+        if self.givens[pos]:
+            self.givens[pos] = False
+            self._toggle(pos, self.solution[pos])
+
+    def restore(self, pos: int) -> None:
+        """Turn pos back into a clue."""
+        if not self.givens[pos]:
+            self.givens[pos] = True
+            self._toggle(pos, self.solution[pos])
+
+    def _toggle(self, pos, digit):
+        bit = 1 << digit
+        masks = self.unit_masks
+        for unit in UNITS_OF[pos]:
+            masks[unit] ^= bit
+
+    def has_other_solution(self, pos: int) -> bool:
+        """Return True if the current givens allow a solution that differs
+        from self.solution at pos."""
+        blanks = [i for i in range(81) if not self.givens[i]]
+        return self._search(blanks, pos, 1 << self.solution[pos])
+
+    def _search(self, blanks, forbidden_pos, forbidden_bit):
+        if not blanks:
+            self.stats.solutions += 1
+            return True
+        masks = self.unit_masks
+        # choose the blank with the fewest candidates
+        best = -1
+        best_mask = 0
+        fewest = 10
+        for index, pos in enumerate(blanks):
+            r, c, h = UNITS_OF[pos]
+            mask = ~(masks[r] | masks[c] | masks[h]) & ALL_DIGITS
+            if pos == forbidden_pos:
+                mask &= ~forbidden_bit
+            count = len(MASK_DIGITS[mask])
+            if count < fewest:
+                best, best_mask, fewest = index, mask, count
+                if count <= 1:
+                    break
+        if not fewest:
+            self.stats.backtracks += 1
+            return False
+        self.stats.nodes += 1
+        pos = blanks[best]
+        blanks[best] = blanks[-1]
+        blanks.pop()
+        for digit in MASK_DIGITS[best_mask]:
+            self._toggle(pos, digit)
+            found = self._search(blanks, forbidden_pos, forbidden_bit)
+            self._toggle(pos, digit)
+            if found:
+                break
+        blanks.append(pos)
+        blanks[best], blanks[-1] = blanks[-1], blanks[best]
+        return found
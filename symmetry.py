@@ -0,0 +1,291 @@
+"""
+Validity-preserving transforms of sudoku puzzles, and a canonical form.
+
+Relabeling the digits, permuting the rows within a band (and the bands
+themselves), permuting the columns within a stack (and the stacks), and
+transposing all turn a valid puzzle into another valid puzzle with the same
+number of solutions, needing the same solving techniques. Together they give
+9! * 6^8 * 2 = 1,218,998,108,160 transforms, so one expensive, carefully
+generated base puzzle stands in for a practically unlimited number of
+distinct-looking ones.
+
+A Transform is compact: it can be packed into a single int with index()
+and rebuilt with Transform.from_index(). Applying one is a gather through a
+precomputed cell map plus a bytes.translate for the digits, both of which
+run in C, so a transform costs a few microseconds per grid.
+
+canonical_form() returns the same 81 bytes for every puzzle that the
+transforms can turn into one another, for deduplicating large batches.
+"""
+from collections import namedtuple
+from itertools import permutations
+from operator import itemgetter
+
+# The 6 orders of 3 things, and the 9! orders of the digits 1 - 9.
+PERM3 = tuple(permutations(range(3)))
+_FACTORIALS = (1, 1, 2, 6, 24, 120, 720, 5040, 40320, 362880)
+COUNT = _FACTORIALS[9] * 6 ** 8 * 2
+
+
+def _rank(perm) -> int:
+    """Return the position of perm among the permutations of its items in
+    lexicographic order."""
+    items = sorted(perm)
+    rank = 0
+    for i, x in enumerate(perm):
+        k = items.index(x)
+        rank += k * _FACTORIALS[len(perm) - 1 - i]
+        del items[k]
+    return rank
+
+
+def _unrank(rank: int, items) -> tuple:
+    items = list(items)
+    perm = []
+    for i in range(len(items) - 1, -1, -1):
+        k, rank = divmod(rank, _FACTORIALS[i])
+        perm.append(items.pop(k))
+    return tuple(perm)
+
+
+def _lines(outer, inner) -> tuple:
+    """Return, for each of the 9 output rows (or columns), the input row it
+    is taken from. outer orders the bands and inner[b] the rows within the
+    b-th output band."""
+    return tuple(3 * outer[b] + inner[b][i] for b in range(3) for i in range(3))
+
+
+_Transform = namedtuple("Transform", "digits bands rows stacks cols transpose")
+
+
+class Transform(_Transform):
+    """One symmetry of the sudoku grid.
+    digits: digit d becomes digits[d - 1].
+    bands, stacks: the order of the input bands and stacks; output band b
+        is input band bands[b].
+    rows, cols: for each output band (stack), the order of its rows
+        (columns) within the input band (stack).
+    transpose: the input is transposed before rows and columns are moved.
+    Only digits and the cell map are needed to apply a transform; both are
+    computed once per transform."""
+    __slots__ = ()
+
+    @classmethod
+    def identity(cls):
+        return cls(tuple(range(1, 10)), (0, 1, 2), (PERM3[0],) * 3,
+                   (0, 1, 2), (PERM3[0],) * 3, False)
+
+    @classmethod
+    def random(cls, rng):
+        """Draw a transform uniformly at random from rng, a random.Random."""
+        return cls.from_index(rng.randrange(COUNT))
+
+    @classmethod
+    def from_index(cls, index: int):
+        """Undo index()."""
+        if not 0 <= index < COUNT:
+            raise ValueError(f"{index} is not a transform index")
+        index, transpose = divmod(index, 2)
+        groups = []
+        for _ in range(8):
+            index, k = divmod(index, 6)
+            groups.append(PERM3[k])
+        groups.reverse()
+        bands, rows, stacks, cols = groups[0], groups[1:4], groups[4], groups[5:8]
+        return cls(_unrank(index, range(1, 10)), bands, tuple(rows),
+                   stacks, tuple(cols), bool(transpose))
+
+    def index(self) -> int:
+        """Pack the transform into an int in [0, COUNT)."""
+        index = _rank(self.digits)
+        for perm in (self.bands,) + self.rows + (self.stacks,) + self.cols:
+            index = index * 6 + PERM3.index(tuple(perm))
+        return index * 2 + self.transpose
+
+    @property
+    def cell_map(self) -> tuple:
+        """cell_map[i] is the input cell that output cell i is taken from."""
+        return _cell_map(self)
+
+    @property
+    def digit_table(self) -> bytes:
+        """A bytes.translate table for the digits; 0 stays 0."""
+        return bytes((0,) + tuple(self.digits) + tuple(range(10, 256)))
+
+    def apply(self, grid) -> bytes:
+        """Return the transform of grid, a sequence of 81 values with 0 for
+        the blanks, as 81 bytes."""
+        return bytes(_gather(self)(bytes(grid))).translate(self.digit_table)
+
+    def apply_clues(self, clues) -> list:
+        """Return where the cells in clues, a list of indices, end up."""
+        inverse = _inverse(self)
+        return sorted(inverse[i] for i in clues)
+
+
+# Cell maps, their gathers, and inverses are cached per transform, since
+# bulk use applies each transform to a puzzle, its solution, and its clues.
+_cache = {}
+
+
+def _tables(t: Transform):
+    tables = _cache.get(t)
+    if tables is None:
+        rows = _lines(t.bands, t.rows)
+        cols = _lines(t.stacks, t.cols)
+        if t.transpose:
+            cell_map = tuple(cols[c] * 9 + rows[r] for r in range(9) for c in range(9))
+        else:
+            cell_map = tuple(rows[r] * 9 + cols[c] for r in range(9) for c in range(9))
+        inverse = [0] * 81
+        for i, src in enumerate(cell_map):
+            inverse[src] = i
+        if len(_cache) >= 4096:
+            _cache.clear()
+        tables = _cache[t] = (cell_map, itemgetter(*cell_map), tuple(inverse))
+    return tables
+
+
+def _cell_map(t):
+    return _tables(t)[0]
+
+
+def _gather(t):
+    return _tables(t)[1]
+
+
+def _inverse(t):
+    return _tables(t)[2]
+
+
+def variants(puzzle, solution, rng, count: int):
+    """Yield count (puzzle, solution) pairs of 81 bytes, each the base
+    puzzle and solution under a transform drawn from rng."""
+    puzzle = bytes(puzzle)
+    solution = bytes(solution)
+    for _ in range(count):
+        t = Transform.random(rng)
+        yield t.apply(puzzle), t.apply(solution)
+
+
+# Every way of ordering the columns, as a gather of the 9 input columns in
+# output order.
+_COLUMN_TAKES = tuple(
+    itemgetter(*_lines(stacks, (a, b, c)))
+    for stacks in PERM3 for a in PERM3 for b in PERM3 for c in PERM3
+)
+
+
+def canonical_form(puzzle) -> bytes:
+    """Return the canonical form of puzzle: the lexicographically smallest
+    grid, after relabeling the digits in order of first appearance, over
+    every row and column permutation and transposition. Two puzzles have
+    the same canonical form exactly when a Transform turns one into the
+    other. Raises ValueError if a digit repeats within a row or column.
+
+    The grid is built a row at a time, keeping only the partial grids whose
+    rows so far are the smallest possible, and merging partial grids that
+    can only go on the same way, so only a small fraction of the 3.4
+    million arrangements are ever looked at."""
+    puzzle = bytes(puzzle)
+    if len(puzzle) != 81:
+        raise ValueError("A puzzle has 81 values")
+    grids = (
+        [puzzle[r * 9:r * 9 + 9] for r in range(9)],
+        [puzzle[c::9] for c in range(9)],
+    )
+    for grid in grids:
+        for line in grid:
+            digits = line.replace(b"\0", b"")
+            if len(set(digits)) != len(digits):
+                raise ValueError("Puzzle repeats a digit in a row or column")
+
+    # With no repeats, the relabeled first row is 1, 2, 3, ... in its
+    # filled cells, so only where its blanks are matters.
+    best = None
+    starts = []
+    for grid in grids:
+        filled = [line.translate(_FILLED) for line in grid]
+        for take in _COLUMN_TAKES:
+            for r in range(9):
+                pattern = take(filled[r])
+                if best is None or pattern < best:
+                    best = pattern
+                    starts = []
+                if pattern == best:
+                    starts.append((grid, take, r))
+    # A state is (rows of the input grid, column order, input rows used so
+    # far, relabeling so far, next label).
+    states = {}
+    first = None
+    for grid, take, r in starts:
+        labels = [0] * 10
+        first, nxt = _relabel(take(grid[r]), labels, 1)
+        state = (grid, take, (r,), labels, nxt)
+        states.setdefault(_future(state), state)
+    form = [first]
+    for _ in range(8):
+        best = None
+        survivors = {}
+        for grid, take, used, labels, nxt in states.values():
+            for r in _next_rows(used):
+                new_labels = labels[:]
+                line, new_nxt = _relabel(take(grid[r]), new_labels, nxt)
+                if best is None or line < best:
+                    best = line
+                    survivors = {}
+                if line == best:
+                    state = (grid, take, used + (r,), new_labels, new_nxt)
+                    survivors.setdefault(_future(state), state)
+        form.append(best)
+        states = survivors
+    return b"".join(form)
+
+
+# Maps each value to 1 if it fills a cell and 0 for a blank.
+_FILLED = bytes([0] + [1] * 255)
+
+
+def _future(state):
+    """Return what is left to place in state, in a form that is the same
+    for two states exactly when they can only be finished the same way."""
+    grid, take, used, labels, nxt = state
+    # labeled digits become their labels; the rest are kept apart at 10+
+    table = bytes([0] + [labels[v] or 10 + v for v in range(1, 10)]) + bytes(246)
+    def line(r):
+        return bytes(take(grid[r])).translate(table)
+    band = used[-1] // 3
+    current = ()
+    if len(used) % 3:
+        current = tuple(sorted(line(r) for r in range(3 * band, 3 * band + 3)
+                               if r not in used))
+    started = {u // 3 for u in used}
+    others = tuple(sorted(
+        tuple(sorted(line(r) for r in range(3 * b, 3 * b + 3)))
+        for b in range(3) if b not in started
+    ))
+    return current, others
+
+
+def _relabel(line, labels, nxt):
+    """Relabel the digits of line, giving new digits the next labels in
+    order. labels is updated in place; returns the line and the next free
+    label."""
+    out = bytearray(9)
+    for i, v in enumerate(line):
+        if v:
+            if not labels[v]:
+                labels[v] = nxt
+                nxt += 1
+            out[i] = labels[v]
+    return bytes(out), nxt
+
+
+def _next_rows(used) -> tuple:
+    """The input rows that can come next, after the rows in used."""
+    if len(used) % 3:
+        # finish the band that was started
+        band = used[-1] // 3
+        return tuple(r for r in range(3 * band, 3 * band + 3) if r not in used)
+    bands = {u // 3 for u in used}
+    return tuple(r for r in range(9) if r // 3 not in bands)
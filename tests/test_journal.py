@@ -0,0 +1,56 @@
+"""
+Undo, redo and seek must put the board back exactly as it was during play,
+pencil marks included. The states are captured live as the moves are made,
+never rebuilt through the journal, so a broken undo cannot agree with
+itself.
+"""
+import random
+import pytest
+from engine import SudokuBoard
+from bitboard import BitBoard
+from journal import MoveJournal
+
+
+def play(board_class, seed: int, moves: int = 200):
+    """Make moves random moves, including pencil marks with digits a peer
+    blocks and marks on filled squares. Returns the journal and the state
+    after each move."""
+    board = board_class(seed=seed)
+    board.generate_puzzle(30)
+    board.track_candidates()
+    journal = MoveJournal(board, checkpoint_every=16)
+    rng = random.Random(seed)
+    blanks = [i for i in range(81) if not board.is_clue(i)]
+    states = [journal._snapshot()]
+    while len(journal) < moves:
+        pos = rng.choice(blanks)
+        if rng.random() < 0.4:
+            made = journal.apply(pos, candidates=rng.randrange(1024) & 0x3FE)
+        else:
+            made = journal.apply(pos, rng.randrange(10))
+        if made:
+            states.append(journal._snapshot())
+    return journal, states
+
+
+@pytest.mark.parametrize("board_class", [SudokuBoard, BitBoard])
+@pytest.mark.parametrize("seed", range(5))
+def test_undo_and_redo_retrace_play(board_class, seed):
+    journal, states = play(board_class, seed)
+    for position in range(len(journal) - 1, -1, -1):
+        journal.undo()
+        assert journal._snapshot() == states[position]
+    for position in range(1, len(journal) + 1):
+        journal.redo()
+        assert journal._snapshot() == states[position]
+
+
+@pytest.mark.parametrize("board_class", [SudokuBoard, BitBoard])
+@pytest.mark.parametrize("seed", range(5))
+def test_seek_matches_play(board_class, seed):
+    journal, states = play(board_class, seed)
+    rng = random.Random(seed)
+    for _ in range(100):
+        position = rng.randrange(len(journal) + 1)
+        journal.seek(position)
+        assert journal._snapshot() == states[position]
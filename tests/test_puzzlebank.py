@@ -0,0 +1,24 @@
+"""
+Every record of a bank, variants included, must be made again by its seed
+and transform alone.
+"""
+from bitboard import BitBoard
+from generate import expand_variants, generate_chunk
+from puzzlebank import PuzzleBank, append_puzzles
+from symmetry import Transform
+
+
+def test_records_regenerate_from_seed_and_transform(tmp_path):
+    path = tmp_path / "puzzles.bank"
+    chunk = generate_chunk(0, 4, 30, 5, False)
+    assert append_puzzles(path, expand_variants(chunk, 3)) == 12
+    board = BitBoard()
+    with PuzzleBank(path) as bank:
+        records = [bank[k] for k in range(len(bank))]
+        assert len({(r.seed, r.transform) for r in records}) == 12
+        for record in records:
+            board.random.seed(record.seed)
+            board.generate_puzzle(30)
+            t = Transform.from_index(record.transform)
+            assert t.apply(board.array) == record.puzzle
+            assert t.apply(board.solution) == record.solution
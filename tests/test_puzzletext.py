@@ -0,0 +1,44 @@
+"""
+Corpora come with headers and the odd bad line; read_puzzles must skip the
+one and report or skip the other.
+"""
+import io
+import pytest
+from puzzletext import read_puzzles
+
+PUZZLE = (
+    "003020600900305001001806400008102900700000008"
+    "006708200002609500800203009005010300"
+)
+SOLUTION = (
+    "483921657967345821251876493548132976729564138"
+    "136798245372689514814253769695417382"
+)
+
+
+def read(text, **kwargs):
+    return list(read_puzzles(io.BytesIO(text.encode()), **kwargs))
+
+
+def test_csv_header_is_skipped():
+    pairs = read(f"quizzes,solutions\r\n{PUZZLE},{SOLUTION}\r\n{PUZZLE}\r\n")
+    puzzle = bytes(int(c) for c in PUZZLE)
+    solution = bytes(int(c) for c in SOLUTION)
+    assert pairs == [(puzzle, solution), (puzzle, None)]
+
+
+def test_bad_line_after_the_first_puzzle_raises():
+    with pytest.raises(ValueError, match="line 3"):
+        read(f"# comment\n{PUZZLE}\nnot a puzzle\n")
+
+
+def test_damaged_first_puzzle_raises():
+    with pytest.raises(ValueError, match="line 1"):
+        read(f"{PUZZLE[:80]}\n{PUZZLE}\n")
+    with pytest.raises(ValueError, match="line 2"):
+        read(f"# comment\n.{PUZZLE[:79]}x\n{PUZZLE}\n")
+
+
+def test_bad_lines_can_be_skipped():
+    pairs = read(f"header\n{PUZZLE}\nnot a puzzle\n{PUZZLE}\n", on_error="skip")
+    assert len(pairs) == 2
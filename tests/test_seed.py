@@ -0,0 +1,56 @@
+"""
+A seed must always produce the same puzzle. If a change to the generator
+makes these fail, that change has to bump engine.GENERATOR_VERSION, and the
+grids below are re-pinned along with the new version.
+"""
+import pytest
+from engine import SudokuBoard, GENERATOR_VERSION
+from bitboard import BitBoard
+from generate import puzzle_seed
+
+PINNED_VERSION = 3
+SOLUTION = (
+    "613487925524169387879523641348291576295746138"
+    "761835492132958764456372819987614253"
+)
+PUZZLE = (
+    "610007920020000000870023600040201500095000100"
+    "000005490000900064400000800907010003"
+)
+UNIQUE_PUZZLE = (
+    "610007900020000000870023600348201000095700100"
+    "000005490000900064000000800907010003"
+)
+
+
+def as_text(values) -> str:
+    return "".join(str(int(v)) for v in values)
+
+
+def test_generator_version():
+    assert GENERATOR_VERSION == PINNED_VERSION
+
+
+def test_batch_seeds():
+    assert puzzle_seed(0, 1) == 1
+    assert puzzle_seed(1, 0) == 1 << 32
+    # the old seed * 1_000_003 + number put these two on the same puzzle
+    assert puzzle_seed(1, 0) != puzzle_seed(0, 1_000_003)
+    with pytest.raises(ValueError):
+        puzzle_seed(0, 1 << 32)
+
+
+@pytest.mark.parametrize("board_class", [SudokuBoard, BitBoard])
+def test_generate_puzzle(board_class):
+    board = board_class(seed=42)
+    board.generate_puzzle(30)
+    assert as_text(board.array) == PUZZLE
+    assert as_text(board.solution) == SOLUTION
+
+
+@pytest.mark.parametrize("board_class", [SudokuBoard, BitBoard])
+def test_generate_unique_puzzle(board_class):
+    board = board_class(seed=42)
+    assert board.generate_unique_puzzle(30) == 30
+    assert as_text(board.array) == UNIQUE_PUZZLE
+    assert as_text(board.solution) == SOLUTION
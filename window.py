@@ -1,9 +1,28 @@
 import pygame
-from engine import SudokuBoard
+from pool import PuzzlePool
+from journal import MoveJournal
+from engine import MASK_DIGITS
+from collections import namedtuple
 import time
 import math
 
 
+FrameMetrics = namedtuple(
+    "FrameMetrics", "events rects waited frame_time event_latency cpu"
+)
+FrameMetrics.__doc__ = """What one pass of Game.run did, passed to the 
+metrics hook.
+events: the number of events handled
+rects: the number of rectangles sent to the display
+waited: seconds spent blocked waiting for an event
+frame_time: seconds spent handling events and drawing
+event_latency: seconds from the first event being queued to the display
+    being updated, or None if there were no events. Events queued while
+    the loop slept in clock.tick are timed from when that sleep began,
+    since pygame does not say when they came in, so this is an upper bound
+cpu: the fraction of the pass the process spent on the CPU"""
+
+
 class Dimensions:
     def __init__(self, size: int = 8) -> None:
         self.size_multiple = size
@@ -105,6 +124,15 @@ class Dimensions:
     @property
     def dark_yellow(self):
         return (230, 199, 7)
+    @property
+    def red(self):
+        return (220, 40, 40)
+    @property
+    def dark_gray(self):
+        return (90, 90, 90)
+    @property
+    def blue(self):
+        return (40, 90, 220)
     
     # Widths 
     @property
@@ -128,6 +156,9 @@ class Dimensions:
     def franklin_font_size(self):
         return 37
     @property
+    def pencil_font_size(self):
+        return 15
+    @property
     def font_height(self):
         return math.floor(self.cell_height * 0.45)
     @property
@@ -153,6 +184,15 @@ class Dimensions:
     def cell_coordinates_number(self, cell_number):
         x, y = self.cell_coordinates(cell_number)
         return x + 25, y + 9
+
+    def cell_coordinates_pencil(self, cell_number, number):
+        """Return the center of the spot for pencil mark 'number' in a cell.
+        The marks are laid out in a 3x3 grid, 1 - 3 along the top."""
+        x, y = self.cell_coordinates(cell_number)
+        col = (number - 1) % 3
+        row = (number - 1) // 3
+        return (x + (col + 0.5) * self.cell_width / 3,
+                y + (row + 0.5) * self.cell_height / 3)
     
 
     @property
@@ -169,7 +209,57 @@ class Window:
         self.display.set_caption("Sudoku")
         # self.font = pygame.font.SysFont(self.dimensions.font, self.dimensions.font_size)
         self.font = pygame.font.Font(self.dimensions.custom_font_path, self.dimensions.franklin_font_size)
-    
+        self.pencil_font = pygame.font.Font(self.dimensions.custom_font_path, self.dimensions.pencil_font_size)
+        self._grid_overlay = None
+        self._grid_overlay_size = None
+        self._glyphs = None
+
+    @property
+    def glyphs(self):
+        """The GlyphAtlas for the current dimensions, rebuilt if they
+        change."""
+        if self._glyphs is None or self._glyphs.size_multiple != self.dimensions.size_multiple:
+            self._glyphs = GlyphAtlas(self.dimensions, self.font, self.pencil_font)
+        return self._glyphs
+
+    @property
+    def grid_overlay(self):
+        """A transparent, window-sized surface holding only the grid lines.
+        It is drawn once and rebuilt if the dimensions change, so a cell can
+        be repainted and then have its lines restored with a single blit."""
+        if self._grid_overlay_size != self.dimensions.size_multiple:
+            overlay = pygame.Surface(
+                (self.dimensions.window_width, self.dimensions.window_height),
+                pygame.SRCALPHA
+            )
+            screen = self.display
+            self.display = Display.for_surface(overlay)
+            try:
+                self.draw_grid()
+            finally:
+                self.display = screen
+            self._grid_overlay = overlay
+            self._grid_overlay_size = self.dimensions.size_multiple
+        return self._grid_overlay
+
+    def cell_rect(self, cell_number):
+        x, y = self.dimensions.cell_coordinates(cell_number)
+        return pygame.Rect(x, y, self.dimensions.cell_width, self.dimensions.cell_height)
+
+    def draw_cell(self, cell_number, color, number=0, style="entry", pencil=0):
+        """Repaint one cell: its background, the grid lines over it, and its
+        number, if it has one, or else the pencil marks in the candidate
+        mask pencil. Returns the rectangle that changed."""
+        rect = self.cell_rect(cell_number)
+        self.color_cell(cell_number, color)
+        self.display.display.blit(self.grid_overlay, rect, area=rect)
+        if number:
+            self.draw_number(number, cell_number, style)
+        else:
+            for mark in MASK_DIGITS[pencil]:
+                self.draw_pencil_mark(mark, cell_number)
+        return rect
+
     def draw_grid(self):
         self.draw_main_box()
         self.draw_houses()
@@ -233,9 +323,14 @@ class Window:
                 thickness=self.dimensions.thin
             )
     
-    def draw_number(self, number, cell):
-        number = self.font.render(str(number), True, self.dimensions.black)
-        pygame.display.get_surface().blit(number, self.dimensions.cell_coordinates_number(cell))
+    def draw_number(self, number, cell, style="entry"):
+        glyph = self.glyphs.glyph(number, style)
+        self.display.display.blit(glyph, self.dimensions.cell_coordinates_number(cell))
+
+    def draw_pencil_mark(self, number, cell):
+        glyph = self.glyphs.glyph(number, "pencil")
+        center = self.dimensions.cell_coordinates_pencil(cell, number)
+        self.display.display.blit(glyph, glyph.get_rect(center=center))
     
     def color_cell(self, cell_number, color):
         x, y, = self.dimensions.cell_coordinates(cell_number)
@@ -261,10 +356,47 @@ class Window:
         self.color_cell(cell_number, self.dimensions.dark_yellow)
 
 
+class GlyphAtlas:
+    """The digits 1 - 9, rendered once in every style so that drawing a 
+    number is a single blit instead of a font rasterization.
+    Styles:
+        clue: the numbers given by the puzzle
+        entry: numbers typed by the player
+        conflict: numbers that clash with another in their region
+        error: numbers that do not match the solution
+        pencil: small candidate marks"""
+    def __init__(self, dimensions, font, pencil_font) -> None:
+        self.size_multiple = dimensions.size_multiple
+        styles = {
+            "clue": (font, dimensions.black),
+            "entry": (font, dimensions.black),
+            "conflict": (font, dimensions.red),
+            "error": (font, dimensions.blue),
+            "pencil": (pencil_font, dimensions.dark_gray),
+        }
+        self.glyphs = {
+            style: [None] + [
+                style_font.render(str(n), True, color) for n in range(1, 10)
+            ]
+            for style, (style_font, color) in styles.items()
+        }
+
+    def glyph(self, number, style="entry"):
+        return self.glyphs[style][number]
+
+
 class Display:
     """An interface for a PyGame display object."""
     def __init__(self, window_width, window_height) -> None:
         self.display = pygame.display.set_mode((window_width, window_height))
+
+    @classmethod
+    def for_surface(cls, surface):
+        """Wrap an off-screen surface so the same drawing methods can be 
+        used on it."""
+        display = cls.__new__(cls)
+        display.display = surface
+        return display
     
     def set_background(self, color):
         pygame.display.get_surface().fill(color)
@@ -299,7 +431,16 @@ class Display:
 
 
 class Game:
-    def __init__(self) -> None:
+    def __init__(self, fps: int = 60, idle_timeout: int = 1000, metrics=None) -> None:
+        """fps caps how often the display is updated; 0 means no cap.
+        idle_timeout is the longest, in milliseconds, the loop blocks 
+        waiting for an event. metrics, if given, is called with a 
+        FrameMetrics after every pass of the loop."""
+        self.fps = fps
+        self.idle_timeout = idle_timeout
+        self.metrics = metrics
+        # when the last pass finished, which is when clock.tick starts
+        self._pass_end = None
         self.highlighted_cell = 0
         self.directional_keys = [
             pygame.K_UP,
@@ -319,61 +460,131 @@ class Game:
             pygame.K_9,
         ]
         self.edit_keys = self.number_keys + [pygame.K_BACKSPACE]
+        self.new_game_key = pygame.K_n
+        self.undo_key = pygame.K_u
+        self.redo_key = pygame.K_r
+        self.pencil_key = pygame.K_p
+        self.show_pencil = True
+        self.hint_key = pygame.K_h
+        self.errors_key = pygame.K_e
+        self.show_errors = False
+        # cells that need repainting before the next display update
+        self.dirty = set()
         
     def setup(self):
-        self.engine = SudokuBoard()
-        self.engine.fill_puzzle()
-
-        self.engine.test_filled_puzzle_is_valid()
-        self.engine.remove_clues(50)
-        self.engine.set_clue_array()
+        # Puzzles are generated in the background. Starting the pool before
+        # the window opens gives the first puzzle a head start.
+        self.puzzles = PuzzlePool(clues=31)
 
         pygame.init()
         self.window = Window()
         icon = pygame.image.load(self.window.dimensions.icon_path)
-        self.draw()
         pygame.display.set_icon(icon)
-        self.draw_exp()
+        self.engine = self.puzzles.take()
+        self.engine.track_candidates()
+        self.journal = MoveJournal(self.engine)
     
     def run(self):
         self.setup()
-        running = True
+        self.running = True
         self.draw()
-        while running:
-            # self.draw()
-
-            for event in pygame.event.get():
-                if event.type == pygame.QUIT:
-                    running = False
-                if event.type == pygame.KEYDOWN:
-                    self.key_input(event.key)
-                    # time.sleep(0.5)
-            # self.check_pressed()
-            pygame.display.update()
+        pygame.display.update()
+        clock = pygame.time.Clock()
+        while self.running:
+            self.run_once()
+            if self.fps:
+                clock.tick(self.fps)
+        self.puzzles.close()
+
+    def run_once(self):
+        """One pass of the main loop: block until an event arrives (or 
+        idle_timeout passes), handle every pending event, and update only
+        the parts of the display that changed."""
+        wall_start = time.perf_counter()
+        cpu_start = time.process_time()
+        # anything already queued came in during clock.tick
+        queued_early = pygame.event.peek()
+        event = pygame.event.wait(self.idle_timeout)
+        arrived = time.perf_counter()
+        queued = arrived
+        if queued_early and self._pass_end is not None:
+            queued = self._pass_end
+        events = []
+        if event.type != pygame.NOEVENT:
+            events = [event] + pygame.event.get()
+        for event in events:
+            if event.type == pygame.QUIT:
+                self.running = False
+            if event.type == pygame.KEYDOWN:
+                self.key_input(event.key)
+        rects = self.draw_dirty()
+        if rects:
+            pygame.display.update(rects)
+        if self.metrics is not None:
+            end = time.perf_counter()
+            self.metrics(FrameMetrics(
+                events=len(events),
+                rects=len(rects),
+                waited=arrived - wall_start,
+                frame_time=end - arrived,
+                event_latency=end - queued if events else None,
+                cpu=(time.process_time() - cpu_start) / max(end - wall_start, 1e-9),
+            ))
+        self._pass_end = time.perf_counter()
     
     def draw(self):
+        """Redraw the whole window. Only needed at startup; after that,
+        changes are drawn cell by cell through invalidate and draw_dirty."""
         self.window.display.fill_background_white()
-        self.make_clues_gray()
-        self.set_highlight()
-        self.window.draw_grid()
-        self.draw_numbers()
-        
-    def draw_numbers(self):
-        for i in range(len(self.engine.array)):
-            if self.engine.array[i] != 0:
-                self.window.draw_number(self.engine.array[i].value, i)
-    
-    def make_clues_gray(self):
-        for i in range(len(self.engine.array)):
-            if i in self.engine.clues:
-                if i == self.highlighted_cell:
-                    self.window.highlight_clue_cell(i)
-                else:
-                    self.window.make_cell_gray(i)
-
-    def draw_exp(self):
-        self.window.highlight_cell(0)
+        self.window.display.display.blit(self.window.grid_overlay, (0, 0))
+        self.invalidate(*range(81))
+        self.draw_dirty()
 
+    def invalidate(self, *cells):
+        """Mark cells as needing to be repainted."""
+        self.dirty.update(cells)
+
+    def draw_dirty(self):
+        """Repaint every invalidated cell, and every cell whose candidates
+        the engine changed, and return the rectangles that changed, for
+        pygame.display.update."""
+        engine = self.engine
+        if self.show_pencil:
+            self.invalidate(*engine.candidates_touched)
+        engine.candidates_touched.clear()
+        rects = [
+            self.window.draw_cell(
+                i, self.cell_color(i), int(engine.array[i]),
+                self.number_style(i), self.pencil_marks(i)
+            )
+            for i in self.dirty
+        ]
+        self.dirty.clear()
+        return rects
+
+    def pencil_marks(self, cell_number):
+        if not self.show_pencil or int(self.engine.array[cell_number]):
+            return 0
+        return self.engine.get_candidate_bits(cell_number)
+
+    def number_style(self, cell_number):
+        if cell_number in self.engine.conflicting:
+            return "conflict"
+        if self.engine.is_clue(cell_number):
+            return "clue"
+        if self.show_errors and not self.engine.is_correct(cell_number):
+            return "error"
+        return "entry"
+
+    def cell_color(self, cell_number):
+        is_clue = self.engine.is_clue(cell_number)
+        if cell_number == self.highlighted_cell:
+            return self.window.dimensions.dark_yellow if is_clue \
+                else self.window.dimensions.yellow
+        if is_clue:
+            return self.window.dimensions.light_gray
+        return self.window.dimensions.white
+        
     def check_pressed(self):
         keys = pygame.key.get_pressed()
         for key in self.directional_keys:
@@ -382,7 +593,6 @@ class Game:
 
     def directional_input(self, direction):
         self.move_highlight(direction)
-        pygame.display.update()
 
     def move_highlight(self, direction):
         if self.highlighted_cell % 9 == 0:
@@ -397,8 +607,7 @@ class Game:
         if self.highlighted_cell // 9 == 8:
             if direction == pygame.K_DOWN:
                 return
-        # self.window.erase_highlight(self.highlighted_cell)
-        self.window.display.fill_background_white()
+        self.invalidate(self.highlighted_cell)
         if direction == pygame.K_UP:
             self.highlighted_cell -= 9
         if direction == pygame.K_DOWN:
@@ -407,17 +616,67 @@ class Game:
             self.highlighted_cell += 1
         if direction == pygame.K_LEFT:
             self.highlighted_cell -= 1
-        if self.highlighted_cell in self.engine.clues:
-            self.window.highlight_clue_cell(self.highlighted_cell)
-        else:
-            self.window.highlight_cell(self.highlighted_cell)  
-        self.draw()      
+        self.invalidate(self.highlighted_cell)
 
     def key_input(self, key):
         if self.is_directional(key):
             self.directional_input(key)
         if key in self.edit_keys:
             self.edit_input(key)
+        if key == self.new_game_key:
+            self.new_game()
+        if key == self.undo_key:
+            self.step_history(self.journal.undo)
+        if key == self.redo_key:
+            self.step_history(self.journal.redo)
+        if key == self.pencil_key:
+            self.toggle_pencil()
+        if key == self.hint_key:
+            self.hint()
+        if key == self.errors_key:
+            self.toggle_errors()
+
+    def toggle_pencil(self):
+        self.show_pencil = not self.show_pencil
+        self.invalidate(*range(81))
+
+    def toggle_errors(self):
+        """Show or hide which entries disagree with the solution. Only
+        filled cells can change style."""
+        self.show_errors = not self.show_errors
+        self.invalidate(*(i for i in range(81) if int(self.engine.array[i])))
+
+    def hint(self):
+        """Fill the highlighted cell from the stored solution, as a move
+        that can be undone. Clues and correct entries are left alone."""
+        cell = self.highlighted_cell
+        engine = self.engine
+        if engine.is_clue(cell) or engine.is_correct(cell):
+            return
+        before = set(engine.conflicting)
+        self.journal.set_value(cell, engine.solution[cell])
+        self.invalidate_conflicts(before)
+        self.invalidate(cell)
+
+    def step_history(self, step):
+        """Undo or redo one move, repainting the cell it touched and any
+        cells whose conflicts changed."""
+        before = set(self.engine.conflicting)
+        cell = step()
+        if cell is not None:
+            self.invalidate_conflicts(before)
+            self.invalidate(cell)
+
+    def new_game(self):
+        """Swap in the next puzzle from the pool. If none is ready yet, 
+        the current puzzle stays, so the loop never waits on the 
+        generator."""
+        board = self.puzzles.take(block=False)
+        if board is not None:
+            board.track_candidates()
+            self.engine = board
+            self.journal.reset(board)
+            self.invalidate(*range(81))
     
     def is_directional(self, key):
         return (
@@ -434,25 +693,22 @@ class Game:
             self.add_number(key)
 
     def remove_number(self):
-        if self.highlighted_cell not in self.engine.clues:
-            self.engine.remove_value(self.highlighted_cell)
-            self.draw()
+        if not self.engine.is_clue(self.highlighted_cell):
+            before = set(self.engine.conflicting)
+            self.journal.remove_value(self.highlighted_cell)
+            self.invalidate_conflicts(before)
+            self.invalidate(self.highlighted_cell)
 
     def add_number(self, key):
-        if self.highlighted_cell not in self.engine.clues:
+        if not self.engine.is_clue(self.highlighted_cell):
+            before = set(self.engine.conflicting)
             for i in range(len(self.number_keys)):
                 if key == self.number_keys[i]:
-                    self.engine.set_value(self.highlighted_cell, i+1)
-            self.draw()
-    
-    def set_highlight(self):
-        if self.highlighted_cell in self.engine.clues:
-            self.window.highlight_clue_cell(self.highlighted_cell)
-        else:
-            self.window.highlight_cell(self.highlighted_cell)  
-    
-
-            
-
-
+                    self.journal.set_value(self.highlighted_cell, i+1)
+            self.invalidate_conflicts(before)
+            self.invalidate(self.highlighted_cell)
 
+    def invalidate_conflicts(self, before):
+        """Repaint the cells that started or stopped conflicting since
+        before was taken from engine.conflicting."""
+        self.invalidate(*(before ^ self.engine.conflicting))